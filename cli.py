@@ -1,9 +1,33 @@
+from concurrent.futures import ProcessPoolExecutor
+from glob import glob
 from pathlib import Path
+from typing import Optional
 from fire import Fire
 
 from individual_players import fit_params
 
 
+def _get_param_path(values_csv_path: str) -> Path:
+    path = Path(values_csv_path)
+    return path.parent / f"{path.stem.removesuffix('_values')}_params.json"
+
+
+def _fit_and_save(values_csv_path: str) -> Path:
+    params, *_ = fit_params(values_csv_path)
+    param_path = _get_param_path(values_csv_path)
+    with open(param_path, "w", encoding="utf-8") as file:
+        file.write(params.to_json())
+    return param_path
+
+
+def _is_up_to_date(values_csv_path: str) -> bool:
+    param_path = _get_param_path(values_csv_path)
+    return (
+        param_path.exists()
+        and param_path.stat().st_mtime >= Path(values_csv_path).stat().st_mtime
+    )
+
+
 class _Cli:
     @staticmethod
     def fit_params(values_csv_path: str):
@@ -11,11 +35,23 @@ class _Cli:
         Create the VPP bayesian update params file
         given a "values" .csv file
         """
-        params, *_ = fit_params(values_csv_path)
-        path = Path(values_csv_path)
-        param_file = f"{path.stem.rstrip('_values')}_params.json"
-        with open(path.parent / param_file, "w") as file:
-            file.write(params.to_json())
+        _fit_and_save(values_csv_path)
+
+    @staticmethod
+    def fit_all_params(
+        values_glob: str, n_workers: Optional[int] = None, force: bool = False
+    ):
+        """
+        Run fit_params on every "values" .csv file matching the glob, in parallel
+
+        Files whose _params.json is newer than the .csv are skipped unless force=True
+        """
+        values_csv_paths = sorted(glob(values_glob))
+        to_fit = [p for p in values_csv_paths if force or not _is_up_to_date(p)]
+        print(f"Fitting {len(to_fit)} of {len(values_csv_paths)} files")
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            for param_path in executor.map(_fit_and_save, to_fit):
+                print(f"Wrote {param_path}")
 
 
 if __name__ == "__main__":
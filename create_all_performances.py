@@ -1,40 +1,58 @@
 import asyncio
 from csv import DictWriter
-from typing import Iterator
+from typing import Iterable
 from endgame_aws import read_box_scores, Config
 
 from individual_players.players import PlayerPerformance, get_player_performances
+from individual_players.stage_report import StageReport
 from individual_players.year import get_current_year
 
 
-async def _read_season_performance(
-    bucket: str, league: str, year: int
-) -> Iterator[PlayerPerformance]:
-    # possessions = await read_possessions(bucket, f"seasons/{year}/{league}.csv")
-    # season = (await read_seasons(bucket, f"seasons/{year}/{league}.pkl"))[0]
-    season_box_scores = await read_box_scores(
-        bucket, f"seasons/{year}/{league}_box.csv"
-    )
-    # TODO: Figure out why there's nones earlier in the flow
-    season_box_scores = [b for b in season_box_scores if b.minutes_played is not None]
-    return get_player_performances(season_box_scores)
+async def main(report_dir: str | None = None):
+    """Download every season's box scores and save their player performances
 
-
-async def main():
+    Parameters
+    ----------
+    report_dir, optional
+        Save a timing/memory report of each stage here (see StageReport)
+    """
     bucket = Config.init_from_file().bucket
-    for league in ["mens", "womens"]:
-        for year in range(2022, get_current_year() + 1):
-            print(league, year)
-            performances = await _read_season_performance(bucket, league, year)
-            with open(
-                f"data/all_performances_{league}_{year}.csv", "w", encoding="utf-8"
-            ) as file:
-                writer = DictWriter(
-                    file,
-                    fieldnames=PlayerPerformance.__dataclass_fields__.keys(),  # pylint: disable=no-member
-                )
-                writer.writeheader()
-                writer.writerows(map(lambda p: p.to_dict(), performances))
+    with StageReport("create_all_performances", report_dir) as report:
+        for league in ["mens", "womens"]:
+            for year in range(2022, get_current_year() + 1):
+                print(league, year)
+                with report.stage(f"download_{league}_{year}") as stage:
+                    # possessions = await read_possessions(bucket, f"seasons/{year}/{league}.csv")
+                    # season = (await read_seasons(bucket, f"seasons/{year}/{league}.pkl"))[0]
+                    season_box_scores = await read_box_scores(
+                        bucket, f"seasons/{year}/{league}_box.csv"
+                    )
+                    stage.n_rows = len(season_box_scores)
+                # Valued as they're written, so a season's performances
+                # are never all in memory at once
+                with report.stage(f"value_and_write_{league}_{year}") as stage:
+                    # TODO: Figure out why there's nones earlier in the flow
+                    season_box_scores = [
+                        b for b in season_box_scores if b.minutes_played is not None
+                    ]
+                    stage.n_rows = _write_performances(
+                        f"data/all_performances_{league}_{year}.csv",
+                        get_player_performances(season_box_scores),
+                    )
+
+
+def _write_performances(path: str, performances: Iterable[PlayerPerformance]) -> int:
+    """Returns how many performances were written"""
+    n_written = 0
+    with open(path, "w", encoding="utf-8") as file:
+        writer = DictWriter(
+            file,
+            fieldnames=PlayerPerformance.__dataclass_fields__.keys(),  # pylint: disable=no-member
+        )
+        writer.writeheader()
+        for n_written, performance in enumerate(performances, start=1):
+            writer.writerow(performance.to_dict())
+    return n_written
 
 
 if __name__ == "__main__":
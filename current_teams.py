@@ -1,3 +1,8 @@
+import multiprocessing
+import os
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
 import pandas as pd
 from fire import Fire
 from individual_players import (
@@ -6,44 +11,151 @@ from individual_players import (
     update_loop,
     LeagueModel,
 )
+from individual_players.derived_columns import load_sd_columns
+from individual_players.snapshot import ratings_to_channel, write_snapshot
+from individual_players.stage_report import StageReport, StageStats
 
 
-_LEAGUES = ["womens", ]"mens"]
+_LEAGUES = ["womens", "mens"]
+_PRIORS = ["", "_team_prior"]
 
+# Each league's performances, loaded before the workers are forked
+# so every prior variant of a league shares one copy
+_performances: dict[str, pd.DataFrame] = {}
 
-def main(prior: str = ""):
-    for league in _LEAGUES:
-        performances = build_combined_df(league)
+
+def main(
+    prior: str | None = None,
+    n_workers: int | None = None,
+    report_dir: str | None = None,
+):
+    """Ratings for every league, for one prior variant (ex: _team_prior)
+    or, by default, all of them, with each (league, prior) pair in its own process
+
+    Parameters
+    ----------
+    report_dir, optional
+        Save a timing/memory report of each stage here (see StageReport)
+    """
+    priors = _PRIORS if prior is None else [prior]
+    pairs = [(league, p) for league in _LEAGUES for p in priors]
+    with StageReport("current_teams", report_dir) as report:
+        with report.stage("load") as stage:
+            with ProcessPoolExecutor(max_workers=len(_LEAGUES)) as executor:
+                _performances.update(
+                    zip(_LEAGUES, executor.map(build_combined_df, _LEAGUES))
+                )
+            stage.n_rows = sum(map(len, _performances.values()))
+        with ProcessPoolExecutor(
+            max_workers=n_workers or len(pairs),
+            mp_context=multiprocessing.get_context("fork"),
+        ) as executor:
+            futures = [
+                executor.submit(
+                    _rate_loaded_league, league, league_prior, report.report_dir
+                )
+                for league, league_prior in pairs
+            ]
+            for future in futures:
+                report.stages.extend(future.result())
+
+
+def _rate_loaded_league(
+    league: str, prior: str, report_dir: Path | None
+) -> list[StageStats]:
+    report = StageReport("current_teams", report_dir)
+    rate_league(league, prior, _performances[league], report)
+    return report.stages
+
+
+def rate_league(
+    league: str,
+    prior: str = "",
+    performances: pd.DataFrame | None = None,
+    report: StageReport | None = None,
+):
+    """Write one league's ratings with the models for a prior variant
+
+    Stages are timed into report, if it's given.
+    Otherwise they get a report of their own, if $STAGE_REPORT_DIR is set."""
+    with (
+        nullcontext(report)
+        if report is not None
+        else StageReport(f"current_teams_{league}{prior}")
+    ) as report:
+        _rate_league(league, prior, performances, report)
+
+
+def _rate_league(
+    league: str,
+    prior: str,
+    performances: pd.DataFrame | None,
+    report: StageReport,
+):
+    name = f"{league}{prior}"
+    with report.stage(f"{name}_load") as stage:
+        if performances is None:
+            performances = build_combined_df(league)
         model = LeagueModel.load(f"./models/{league}.pkl")
         defense_model = LeagueModel.load(f"./models/{league}_defense{prior}.pkl")
         adjusted_model = LeagueModel.load(f"./models/{league}_adjusted{prior}.pkl")
+        stage.n_rows = len(performances)
+    with report.stage(f"{name}_sds"):
+        # Saved the first time for this data and these models
         performances = performances.assign(
-            vpp_sd=model.possessions_to_vpp_std(performances.n_possessions),
-            defense_sd=defense_model.possessions_to_vpp_std(performances.n_possessions),
-            adjusted_vpp_sd=adjusted_model.possessions_to_vpp_std(
-                performances.n_possessions
-            ),
+            **load_sd_columns(
+                performances,
+                {
+                    "vpp_sd": f"./models/{league}.pkl",
+                    "defense_sd": f"./models/{league}_defense{prior}.pkl",
+                    "adjusted_vpp_sd": f"./models/{league}_adjusted{prior}.pkl",
+                },
+                name,
+            )
         )
+    with report.stage(f"{name}_rating_loop") as stage:
         defense_callback = callbacks.DefenseAdjustedCallback(
             defense_model, adjusted_model
         )
-        _ = update_loop(
-            performances,
-            model,
-            None,
-            [defense_callback.team_callback],
-            [defense_callback.player_callback],
+        offense_ratings = update_loop(
+            performances, model, None, [defense_callback.team_callback]
         )
+        stage.n_rows = len(performances)
+    with report.stage(f"{name}_export") as stage:
+        player_ids = offense_ratings.index.to_numpy()
+        write_snapshot(
+            f"data/{league}_player_ratings{prior}.snapshot",
+            player_ids,
+            {
+                "offense": ratings_to_channel(offense_ratings, player_ids),
+                "defense": ratings_to_channel(
+                    defense_callback.defense_ratings, player_ids
+                ),
+                "adjusted_offense": ratings_to_channel(
+                    defense_callback.adjusted_offense_rating, player_ids
+                ),
+            },
+        )
+
         league_ratings = pd.DataFrame(
             defense_callback.adjusted_offense_rating
         ).T.rename(columns={0: "vpp", 1: "vpp_var"})
-        
-        league_ratings.to_csv(f"data/{league}_player_ratings{prior}.csv")
-        (
-            pd.DataFrame(defense_callback.defense_ratings)
-            .T.rename(columns={0: "vpp", 1: "vpp_var"})
-            .to_csv(f"data/{league}_player_ratings_defense{prior}.csv")
+
+        _to_csv_atomically(league_ratings, f"data/{league}_player_ratings{prior}.csv")
+        _to_csv_atomically(
+            pd.DataFrame(defense_callback.defense_ratings).T.rename(
+                columns={0: "vpp", 1: "vpp_var"}
+            ),
+            f"data/{league}_player_ratings_defense{prior}.csv",
         )
+        stage.n_rows = len(player_ids)
+
+
+def _to_csv_atomically(data_frame: pd.DataFrame, path: str):
+    """So readers never see a half-written file, even with other leagues running"""
+    temp_path = Path(f"{path}.{os.getpid()}.tmp")
+    data_frame.to_csv(temp_path)
+    temp_path.replace(path)
 
 
 if __name__ == "__main__":
@@ -1,35 +1,46 @@
 from pathlib import Path
 from fire import Fire
-from individual_players import LeagueModel, build_combined_df, update_loop, callbacks
+from individual_players import LeagueModel, PossessionAllocator, build_combined_df
+from individual_players.batch_ratings import get_pregame_ratings
+from individual_players.derived_columns import load_sd_columns
+from individual_players.stage_report import StageReport
 
 
-def main(league: str):
-    performances = build_combined_df(league, verbose=False)
-    model = LeagueModel.load(str(Path("models", f"{league}_league.pkl")))
-    performances = performances.assign(
-        vpp_sd=model.possessions_to_vpp_std(performances.n_possessions)
-    )
-    # TODO: actually sort by date
-    performances = performances.sort_values("game_id")
-    game_possessions = (
-        performances.groupby("game_id")
-        .agg({"n_possessions": "sum"})
-        .reset_index()
-        .assign(game_possessions=lambda _: _.n_possessions / 5 / 2)[
-            ["game_possessions", "game_id"]
-        ]
-    )
-    performances = performances.merge(game_possessions, on="game_id").assign(
-        possessions_proportion=lambda _: _.n_possessions / (_.game_possessions * 5)
-    )
-    allocations = callbacks.PossessionAllocationCallbacks()
-    update_loop(
-        performances,
-        model,
-        team_callbacks=[allocations.team_callback],
-        player_callbacks=[allocations.player_callback],
-    )
-    allocations.allocator.save(str(Path("models", f"{league}_allocator.pkl")))
+def main(league: str, report_dir: str | None = None):
+    with StageReport(f"fit_possession_allocator_{league}", report_dir) as report:
+        with report.stage("load") as stage:
+            performances = build_combined_df(league, verbose=False)
+            model = LeagueModel.load(str(Path("models", f"{league}.pkl")))
+            stage.n_rows = len(performances)
+        with report.stage("prepare"):
+            performances = performances.assign(
+                **load_sd_columns(
+                    performances, {"vpp_sd": Path("models", f"{league}.pkl")}, league
+                )
+            )
+            # TODO: actually sort by date
+            performances = performances.sort_values("game_id")
+            game_possessions = (
+                performances.groupby("game_id")
+                .agg({"n_possessions": "sum"})
+                .reset_index()
+                .assign(game_possessions=lambda _: _.n_possessions / 5 / 2)[
+                    ["game_possessions", "game_id"]
+                ]
+            )
+            performances = performances.merge(game_possessions, on="game_id").assign(
+                possessions_proportion=lambda _: _.n_possessions
+                / (_.game_possessions * 5)
+            )
+        with report.stage("pregame_ratings") as stage:
+            pregame_vpp, _ = get_pregame_ratings(performances, model)
+            stage.n_rows = len(pregame_vpp)
+        with report.stage("fit"):
+            allocator = PossessionAllocator.from_pregame_ratings(
+                performances, pregame_vpp
+            )
+        with report.stage("save"):
+            allocator.save(str(Path("models", f"{league}_allocator.pkl")))
 
 
 if __name__ == "__main__":
@@ -1,6 +1,37 @@
-from .allocator import PossessionAllocator
-from .priors import build_prior_getter
-from .performance_filter import build_combined_df
-from .update_params import fit_params
-from .league_model import LeagueModel
-from .loop import update_loop
+from importlib import import_module
+from typing import TYPE_CHECKING
+
+# Public name -> the module it comes from. They're imported the first time
+# they're used, so a script only pays for the dependencies of what it needs
+# (ex: update_params needs sklearn, league_model needs dill)
+_EXPORTS = {
+    "PossessionAllocator": ".allocator",
+    "build_prior_getter": ".priors",
+    "build_combined_df": ".performance_filter",
+    "fit_params": ".update_params",
+    "LeagueModel": ".league_model",
+    "update_loop": ".loop",
+}
+
+if TYPE_CHECKING:
+    from .allocator import PossessionAllocator
+    from .priors import build_prior_getter
+    from .performance_filter import build_combined_df
+    from .update_params import fit_params
+    from .league_model import LeagueModel
+    from .loop import update_loop
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(_EXPORTS[name], __name__), name)
+    # So this is only called once per name
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted({*globals(), *_EXPORTS})
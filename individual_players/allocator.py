@@ -1,5 +1,6 @@
 import pickle
 from typing import NamedTuple
+import numpy as np
 import pandas as pd
 
 
@@ -10,27 +11,104 @@ class MinutesAllocation(NamedTuple):
 
 class PossessionAllocator:
     def __init__(self, allocations: list[MinutesAllocation]):
-        allocation_df = pd.DataFrame(allocations)
-        self._possessions_proportion = (
-            allocation_df.groupby("team_vpp_rank")
-            .mean()
-            .reset_index()
-            .possessions_proportion
-            # Make sure it's monotonically descending
-            .cummin()
+        self._possessions_proportion = _mean_by_rank(
+            np.fromiter((a.possessions_proportion for a in allocations), dtype=float),
+            np.fromiter((a.team_vpp_rank for a in allocations), dtype=np.int64),
+        )
+
+    @classmethod
+    def from_ranks(
+        cls, possessions_proportion: np.ndarray, team_vpp_rank: np.ndarray
+    ) -> "PossessionAllocator":
+        """Fit from arrays of each player-game's possessions proportion and team rank"""
+        allocator = cls.__new__(cls)
+        allocator._possessions_proportion = _mean_by_rank(
+            np.asarray(possessions_proportion, dtype=float),
+            np.asarray(team_vpp_rank, dtype=np.int64),
+        )
+        return allocator
+
+    @classmethod
+    def from_pregame_ratings(
+        cls, performances: pd.DataFrame, pregame_vpp: np.ndarray
+    ) -> "PossessionAllocator":
+        """Fit from performances (with a possessions_proportion column)
+        and each row's pregame VPP rating (ex: from get_pregame_ratings)"""
+        team_game_index = (
+            performances.groupby(["game_id", "team_id"], sort=False).ngroup().to_numpy()
+        )
+        return cls.from_ranks(
+            performances.possessions_proportion.to_numpy(),
+            _rank_within_groups(np.asarray(pregame_vpp), team_game_index) + 1,
         )
 
     def allocate(
         self, player_ratings: dict[str, tuple[float, float]]
     ) -> dict[str, float]:
         ranked = sorted(player_ratings.items(), key=lambda kv: kv[1][0], reverse=True)
-        scaled_proportions = self._possessions_proportion[: len(ranked)]
-        scaled_proportions /= scaled_proportions.sum()
+        if not ranked:
+            return {}
+        proportions = self._possessions_proportion[: len(ranked)]
+        total = proportions.sum()
+        # Nothing to scale (ex: every rank's proportion rounded to 0),
+        # so they split it evenly
+        if total > 0:
+            scaled_proportions = proportions / total
+        else:
+            scaled_proportions = pd.Series(
+                1 / len(proportions), index=proportions.index
+            )
         return {
             player_id: proportion
             for (player_id, _), proportion in zip(ranked, scaled_proportions)
         }
 
+    def allocate_batch(
+        self, ratings: np.ndarray, team_offsets: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Allocate possessions for many teams at once
+
+        Parameters
+        ----------
+        ratings
+            Every team's player VPP ratings, with each team's players next to each other
+        team_offsets
+            Where each team's players start in ratings, plus len(ratings) at the end
+            (so team i is ratings[team_offsets[i] : team_offsets[i + 1]])
+
+        Returns
+        -------
+        The 1-based rank of each player within their team,
+        and the proportion of their team's possessions they get.
+        Players ranked past the longest team in the fit data get 0,
+        and if a team's proportions add up to 0, the rest split it evenly
+        (like allocate).
+        """
+        ratings = np.asarray(ratings, dtype=float)
+        team_offsets = np.asarray(team_offsets)
+        team_sizes = np.diff(team_offsets)
+        team_index = np.repeat(np.arange(len(team_sizes)), team_sizes)
+
+        ranks = _rank_within_groups(ratings, team_index)
+
+        stored_proportions = self._possessions_proportion.to_numpy()
+        proportions = np.zeros(len(ratings))
+        has_proportion = ranks < len(stored_proportions)
+        proportions[has_proportion] = stored_proportions[ranks[has_proportion]]
+        team_totals = np.bincount(
+            team_index, weights=proportions, minlength=len(team_sizes)
+        )[team_index]
+        n_with_proportion = np.bincount(
+            team_index, weights=has_proportion, minlength=len(team_sizes)
+        )[team_index]
+        shares = np.divide(
+            proportions,
+            team_totals,
+            out=has_proportion / np.maximum(n_with_proportion, 1),
+            where=team_totals > 0,
+        )
+        return ranks + 1, shares
+
     def save(self, filename: str):
         with open(filename, "wb") as file:
             pickle.dump(self, file)
@@ -39,3 +117,27 @@ class PossessionAllocator:
     def load(cls, filename: str) -> "PossessionAllocator":
         with open(filename, "rb") as file:
             return pickle.load(file)
+
+
+def _mean_by_rank(
+    possessions_proportion: np.ndarray, team_vpp_rank: np.ndarray
+) -> pd.Series:
+    counts = np.bincount(team_vpp_rank)
+    totals = np.bincount(team_vpp_rank, weights=possessions_proportion)
+    has_rank = counts > 0
+    return (
+        pd.Series(totals[has_rank] / counts[has_rank], name="possessions_proportion")
+        # Make sure it's monotonically descending
+        .cummin()
+    )
+
+
+def _rank_within_groups(values: np.ndarray, group_index: np.ndarray) -> np.ndarray:
+    """0-based rank of each value within its group, highest first
+    (ties keep their order, like sorted)"""
+    order = np.lexsort((-values, group_index))
+    sorted_groups = group_index[order]
+    group_starts = np.searchsorted(sorted_groups, sorted_groups, side="left")
+    ranks = np.empty(len(values), dtype=np.int64)
+    ranks[order] = np.arange(len(values)) - group_starts
+    return ranks
@@ -0,0 +1,138 @@
+# mypy: disable-error-code="arg-type"
+# because there's lots of pandas in here
+from concurrent.futures import ProcessPoolExecutor
+import dill
+import numpy as np
+import pandas as pd
+
+from .batch_ratings import RatingVariant, run_rating_variants
+from .binned_stats import BinnedStats, assign_percentile_bins, binned_median
+from .shared_performances import SharedPerformances, attach_data_frame
+
+
+# Two-sided 90% interval of a standard normal
+_Z_90 = 1.6449
+
+
+def score_pregame_ratings(
+    performances: pd.DataFrame,
+    pregame_vpp: np.ndarray,
+    pregame_vpp_var: np.ndarray,
+    vpp_sd: np.ndarray,
+    n_buckets: int = 10,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Score how well each row's pregame rating predicted its game
+
+    Every row's VPP is predicted as normal with mean pregame_vpp
+    and variance pregame_vpp_var + vpp_sd ** 2. The ratings only use earlier
+    games, so this is out of sample (the models' sd curves aren't, though).
+
+    Returns
+    -------
+    summary
+        By season (if there's a season column): mean log-likelihood per row,
+        and the RMSE of team-game VPP vs the possession-weighted pregame ratings
+    calibration
+        By n_possessions percentile bucket: mean and variance of the z-scores
+        (should be ~0 and ~1), and how often VPP landed in the 90% interval
+    """
+    n_possessions = performances.n_possessions.to_numpy()
+    value = performances["value"].to_numpy()
+    predictive_var = pregame_vpp_var + vpp_sd**2
+    residual = value / n_possessions - pregame_vpp
+    log_likelihood = -0.5 * (
+        np.log(2 * np.pi * predictive_var) + residual**2 / predictive_var
+    )
+    z_scores = residual / np.sqrt(predictive_var)
+
+    if "season" in performances:
+        season_index, seasons = pd.factorize(performances.season, sort=True)
+    else:
+        season_index, seasons = np.zeros(len(performances), dtype=np.int64), ["all"]
+    n_seasons = len(seasons)
+
+    team_game_index = (
+        performances.groupby(["game_id", "team_id"], sort=False).ngroup().to_numpy()
+    )
+    team_possessions = np.bincount(team_game_index, weights=n_possessions)
+    team_vpp = np.bincount(team_game_index, weights=value) / team_possessions
+    expected_team_vpp = (
+        np.bincount(team_game_index, weights=pregame_vpp * n_possessions)
+        / team_possessions
+    )
+    _, first_rows = np.unique(team_game_index, return_index=True)
+    team_game_seasons = season_index[first_rows]
+
+    n_rows = np.bincount(season_index, minlength=n_seasons)
+    n_team_games = np.bincount(team_game_seasons, minlength=n_seasons)
+    summary = pd.DataFrame(
+        {
+            "n_rows": n_rows,
+            "log_likelihood": np.bincount(
+                season_index, weights=log_likelihood, minlength=n_seasons
+            )
+            / n_rows,
+            "team_vpp_rmse": np.sqrt(
+                np.bincount(
+                    team_game_seasons,
+                    weights=(team_vpp - expected_team_vpp) ** 2,
+                    minlength=n_seasons,
+                )
+                / n_team_games
+            ),
+        },
+        index=pd.Index(seasons, name="season"),
+    )
+
+    bucket = assign_percentile_bins(n_possessions, n_buckets)
+    z_stats = BinnedStats.from_values(bucket, z_scores, n_buckets)
+    calibration = pd.DataFrame(
+        {
+            "n_rows": z_stats.counts,
+            "median_possessions": binned_median(bucket, n_possessions, n_buckets),
+            "mean_z": z_stats.means,
+            "z_var": z_stats.variance,
+            "coverage_90": np.bincount(
+                bucket, weights=np.abs(z_scores) < _Z_90, minlength=n_buckets
+            )
+            / z_stats.counts,
+        },
+        index=pd.Index(np.arange(n_buckets), name="bucket"),
+    )
+    return summary, calibration
+
+
+def backtest_variants(
+    performances: pd.DataFrame,
+    variants: dict[str, RatingVariant],
+    n_workers: int | None = None,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Run and score each variant's offensive ratings (see score_pregame_ratings),
+    one process per variant, with a variant column added to the outputs"""
+    # The workers share one copy of the performances.
+    # Models hold closures, which need dill rather than pickle
+    with SharedPerformances(performances) as shared, ProcessPoolExecutor(
+        max_workers=n_workers
+    ) as executor:
+        payloads = [
+            dill.dumps((shared.descriptor, name, variant))
+            for name, variant in variants.items()
+        ]
+        results = list(executor.map(_backtest_variant, payloads))
+    return (
+        pd.concat([summary for summary, _ in results]),
+        pd.concat([calibration for _, calibration in results]),
+    )
+
+
+def _backtest_variant(payload: bytes) -> tuple[pd.DataFrame, pd.DataFrame]:
+    descriptor, name, variant = dill.loads(payload)
+    performances = attach_data_frame(descriptor)
+    offense = run_rating_variants(performances, [variant]).offense
+    vpp_sd = np.asarray(
+        variant.model.possessions_to_vpp_std(performances.n_possessions.to_numpy())
+    )
+    summary, calibration = score_pregame_ratings(
+        performances, offense.pregame_vpp[0], offense.pregame_vpp_var[0], vpp_sd
+    )
+    return summary.assign(variant=name), calibration.assign(variant=name)
@@ -0,0 +1,304 @@
+# mypy: disable-error-code="arg-type"
+# because there's lots of pandas in here
+"""Ratings computed for every row at once instead of looping through games
+
+A player's rating only depends on their own games
+(plus, for defense and adjusted ratings, team-game aggregates of
+other ratings going into that game, which are known up front),
+and a run of normal updates is just a precision-weighted average.
+So each rating comes from cumulative sums over that player's earlier games,
+and K variants can be run as (K, n_rows) arrays for about the cost of one.
+"""
+from typing import NamedTuple
+import numpy as np
+import pandas as pd
+
+from .league_model import LeagueModel
+from .priors import PriorGetter, get_batch_prior_getter, get_simple_prior
+
+
+class RatingVariant(NamedTuple):
+    """One (model, prior) configuration to run
+
+    defense_model and adjusted_model are only needed for
+    defense and adjusted offense ratings (like DefenseAdjustedCallback)
+    """
+
+    model: LeagueModel
+    prior_getter: PriorGetter | None = None
+    defense_model: LeagueModel | None = None
+    adjusted_model: LeagueModel | None = None
+
+
+class RatingChannel(NamedTuple):
+    """One kind of rating (ex: offense) for each of K variants"""
+
+    player_ids: np.ndarray
+    # (K, n_players) ratings after every game
+    vpp: np.ndarray
+    vpp_var: np.ndarray
+    # (K, n_rows) ratings going into each row's game, in the performances' row order
+    pregame_vpp: np.ndarray
+    pregame_vpp_var: np.ndarray
+
+    def to_data_frame(self, variant: int = 0) -> pd.DataFrame:
+        """Final ratings for one variant, like update_loop returns"""
+        return pd.DataFrame(
+            {"vpp": self.vpp[variant], "vpp_var": self.vpp_var[variant]},
+            index=self.player_ids,
+        )
+
+
+class BatchedRatings(NamedTuple):
+    offense: RatingChannel
+    defense: RatingChannel | None = None
+    adjusted_offense: RatingChannel | None = None
+
+
+class _OrderedRows(NamedTuple):
+    """Performances in the order update_loop processes them,
+    plus what's needed to group them by player"""
+
+    # Original row positions, in game order
+    order: np.ndarray
+    player_index: np.ndarray
+    # Players are numbered in order of their first game
+    player_ids: np.ndarray
+    first_team_ids: np.ndarray
+    # Ordered row positions sorted by player (still in game order for each player)
+    by_player: np.ndarray
+    player_counts: np.ndarray
+    player_starts: np.ndarray
+    team_game_index: np.ndarray
+    n_possessions: np.ndarray
+    vpp: np.ndarray
+
+
+def get_game_order(performances: pd.DataFrame) -> np.ndarray:
+    """Row positions in the order update_loop processes them (by game_id)"""
+    game_index, _ = pd.factorize(performances.game_id, sort=True)
+    return np.argsort(game_index, kind="stable")
+
+
+def get_pregame_ratings(
+    performances: pd.DataFrame,
+    model: LeagueModel,
+    prior_getter: PriorGetter | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Every row's (VPP, VPP variance) rating going into that game,
+    matching what update_loop has for them, but without looping.
+    Needs a vpp_sd column (like update_loop).
+    """
+    rows = _order_rows(performances)
+    prior_vpp, prior_var = _get_priors(rows, prior_getter or get_simple_prior(model))
+    vpp_sd = performances.vpp_sd.to_numpy()[rows.order]
+    pregame_vpp, pregame_var, _, _ = _run_updates(
+        rows, prior_vpp[None], prior_var[None], rows.vpp[None], vpp_sd[None]
+    )
+    return _to_row_order(rows, pregame_vpp)[0], _to_row_order(rows, pregame_var)[0]
+
+
+def run_rating_variants(
+    performances: pd.DataFrame, variants: list[RatingVariant]
+) -> BatchedRatings:
+    """Run update_loop's rating logic for several variants in one pass
+
+    Each variant's sds come from its own models' possessions_to_vpp_std,
+    so the performances don't need vpp_sd/defense_sd/adjusted_vpp_sd columns.
+    Defense and adjusted offense ratings are the same as DefenseAdjustedCallback's,
+    and are only computed if every variant has a defense and adjusted model.
+    """
+    rows = _order_rows(performances)
+    n_variants = len(variants)
+    n_players = len(rows.player_ids)
+
+    priors = [
+        _get_priors(rows, v.prior_getter or get_simple_prior(v.model)) for v in variants
+    ]
+    vpp = np.broadcast_to(rows.vpp, (n_variants, len(rows.vpp)))
+    offense = _build_channel(
+        rows,
+        np.stack([mu for mu, _ in priors]),
+        np.stack([var for _, var in priors]),
+        vpp,
+        _get_sds(rows, [v.model for v in variants]),
+    )
+
+    defense_models: list[LeagueModel] = []
+    adjusted_models: list[LeagueModel] = []
+    for v in variants:
+        if v.defense_model is not None and v.adjusted_model is not None:
+            defense_models.append(v.defense_model)
+            adjusted_models.append(v.adjusted_model)
+    if not defense_models:
+        return BatchedRatings(offense)
+    if len(defense_models) < n_variants:
+        raise ValueError(
+            "Either all or none of the variants need defense and adjusted models"
+        )
+
+    # Same pairing as DefenseAdjustedCallback: each row's defensive result
+    # is its team-game's VPP vs what the team's pregame ratings expected,
+    # and its adjustment is its team-game's average pregame defense rating
+    team_vpp = _team_game_average(rows, rows.vpp[None])
+    vs_expectation = team_vpp - _team_game_average(
+        rows, offense.pregame_vpp[:, rows.order]
+    )
+    defense = _build_channel(
+        rows,
+        *_get_simple_priors(defense_models, n_players),
+        vs_expectation,
+        _get_sds(rows, defense_models),
+    )
+    adjustment = _team_game_average(rows, defense.pregame_vpp[:, rows.order])
+    adjusted_offense = _build_channel(
+        rows,
+        *_get_simple_priors(adjusted_models, n_players),
+        vpp - adjustment,
+        _get_sds(rows, adjusted_models),
+    )
+    return BatchedRatings(offense, defense, adjusted_offense)
+
+
+def _order_rows(performances: pd.DataFrame) -> _OrderedRows:
+    order = get_game_order(performances)
+    player_index, player_ids = pd.factorize(performances.player_id.to_numpy()[order])
+    by_player = np.argsort(player_index, kind="stable")
+    player_counts = np.bincount(player_index, minlength=len(player_ids))
+    player_starts = np.cumsum(player_counts) - player_counts
+    team_game_index = (
+        performances.groupby(["game_id", "team_id"], sort=False).ngroup().to_numpy()
+    )
+    n_possessions = performances.n_possessions.to_numpy()[order]
+    return _OrderedRows(
+        order=order,
+        player_index=player_index,
+        player_ids=player_ids,
+        first_team_ids=performances.team_id.to_numpy()[order][by_player][player_starts],
+        by_player=by_player,
+        player_counts=player_counts,
+        player_starts=player_starts,
+        team_game_index=team_game_index[order],
+        n_possessions=n_possessions,
+        vpp=performances["value"].to_numpy()[order] / n_possessions,
+    )
+
+
+def _get_priors(
+    rows: _OrderedRows, prior_getter: PriorGetter
+) -> tuple[np.ndarray, np.ndarray]:
+    """Prior for each player, using the team they had in their first game"""
+    values, variances = get_batch_prior_getter(prior_getter)(
+        rows.player_ids, rows.first_team_ids
+    )
+    return np.asarray(values, dtype=float), np.asarray(variances, dtype=float)
+
+
+def _get_simple_priors(
+    models: list[LeagueModel], n_players: int
+) -> tuple[np.ndarray, np.ndarray]:
+    means = np.array([m.vpp_mean for m in models], dtype=float)
+    variances = np.array([m.vpp_variance for m in models], dtype=float)
+    return (
+        np.repeat(means[:, None], n_players, axis=1),
+        np.repeat(variances[:, None], n_players, axis=1),
+    )
+
+
+def _get_sds(rows: _OrderedRows, models: list[LeagueModel]) -> np.ndarray:
+    return np.stack(
+        [np.asarray(m.possessions_to_vpp_std(rows.n_possessions)) for m in models]
+    )
+
+
+def _build_channel(
+    rows: _OrderedRows,
+    prior_vpp: np.ndarray,
+    prior_var: np.ndarray,
+    values: np.ndarray,
+    value_sds: np.ndarray,
+) -> RatingChannel:
+    pregame_vpp, pregame_var, final_vpp, final_var = _run_updates(
+        rows, prior_vpp, prior_var, values, value_sds
+    )
+    return RatingChannel(
+        player_ids=rows.player_ids,
+        vpp=final_vpp,
+        vpp_var=final_var,
+        pregame_vpp=_to_row_order(rows, pregame_vpp),
+        pregame_vpp_var=_to_row_order(rows, pregame_var),
+    )
+
+
+def _run_updates(
+    rows: _OrderedRows,
+    prior_vpp: np.ndarray,
+    prior_var: np.ndarray,
+    values: np.ndarray,
+    value_sds: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Apply every row's normal update to each player's rating, for K variants
+
+    Priors are (K, n_players), values and sds are (K, n_rows) in game order.
+    Returns (K, n_rows) pregame ratings (in game order)
+    and (K, n_players) final ratings.
+    """
+    prior_precision = 1 / prior_var
+    prior_weighted = prior_vpp * prior_precision
+    game_precision = 1 / value_sds**2
+    game_weighted = values * game_precision
+
+    precision = prior_precision[:, rows.player_index] + _cumsum_before(
+        rows, game_precision
+    )
+    weighted = prior_weighted[:, rows.player_index] + _cumsum_before(
+        rows, game_weighted
+    )
+    final_precision = prior_precision + _sum_by_player(rows, game_precision)
+    final_weighted = prior_weighted + _sum_by_player(rows, game_weighted)
+    return (
+        weighted / precision,
+        1 / precision,
+        final_weighted / final_precision,
+        1 / final_precision,
+    )
+
+
+def _cumsum_before(rows: _OrderedRows, values: np.ndarray) -> np.ndarray:
+    """Sum of each player's values from earlier games, for (K, n_rows) values"""
+    sorted_values = values[:, rows.by_player]
+    before = np.cumsum(sorted_values, axis=1) - sorted_values
+    before -= np.repeat(before[:, rows.player_starts], rows.player_counts, axis=1)
+    earlier = np.empty_like(before)
+    earlier[:, rows.by_player] = before
+    return earlier
+
+
+def _sum_by_player(rows: _OrderedRows, values: np.ndarray) -> np.ndarray:
+    return np.add.reduceat(values[:, rows.by_player], rows.player_starts, axis=1)
+
+
+def _team_game_average(rows: _OrderedRows, values: np.ndarray) -> np.ndarray:
+    """Possession-weighted average of (K, n_rows) values over each row's team-game"""
+    n_team_games = rows.team_game_index.max() + 1
+    total_possessions = np.bincount(
+        rows.team_game_index, weights=rows.n_possessions, minlength=n_team_games
+    )
+    averages = np.stack(
+        [
+            np.bincount(
+                rows.team_game_index,
+                weights=variant_values * rows.n_possessions,
+                minlength=n_team_games,
+            )
+            for variant_values in values
+        ]
+    )
+    return (averages / total_possessions)[:, rows.team_game_index]
+
+
+def _to_row_order(rows: _OrderedRows, values: np.ndarray) -> np.ndarray:
+    """(K, n_rows) values in game order -> the performances' row order"""
+    in_row_order = np.empty_like(values)
+    in_row_order[:, rows.order] = values
+    return in_row_order
@@ -0,0 +1,104 @@
+from dataclasses import dataclass
+from typing import Self
+import numpy as np
+
+
+@dataclass
+class BinnedStats:
+    """Count, mean and sum of squared deviations of a value in each of a fixed set of bins
+
+    Bins are referenced by integer index (0 to n_bins - 1).
+    New batches are folded in with Chan et al.'s parallel update,
+    so stats from different chunks of data (or different seasons)
+    can be combined without going back to the raw values.
+    """
+
+    counts: np.ndarray
+    means: np.ndarray
+    m2s: np.ndarray
+
+    @classmethod
+    def empty(cls: type[Self], n_bins: int) -> Self:
+        return cls(
+            counts=np.zeros(n_bins, dtype=np.int64),
+            means=np.zeros(n_bins),
+            m2s=np.zeros(n_bins),
+        )
+
+    @classmethod
+    def from_values(
+        cls: type[Self], bin_ids: np.ndarray, values: np.ndarray, n_bins: int
+    ) -> Self:
+        """Compute the stats of each bin in one pass over the values"""
+        bin_ids = np.asarray(bin_ids, dtype=np.int64)
+        values = np.asarray(values, dtype=float)
+        counts = np.bincount(bin_ids, minlength=n_bins)
+        sums = np.bincount(bin_ids, weights=values, minlength=n_bins)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = np.where(counts > 0, sums / counts, 0.0)
+        deviations = values - means[bin_ids]
+        m2s = np.bincount(bin_ids, weights=deviations**2, minlength=n_bins)
+        return cls(counts=counts, means=means, m2s=m2s)
+
+    @property
+    def n_bins(self) -> int:
+        return len(self.counts)
+
+    @property
+    def variance(self) -> np.ndarray:
+        """Sample variance (ddof=1, like pandas) of each bin, NaN if there's < 2 values"""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(self.counts > 1, self.m2s / (self.counts - 1), np.nan)
+
+    @property
+    def std(self) -> np.ndarray:
+        return np.sqrt(self.variance)
+
+    def merge(self, other: "BinnedStats") -> "BinnedStats":
+        """Combine the stats of two sets of values that used the same bins"""
+        if other.n_bins != self.n_bins:
+            raise ValueError(f"Can't merge {other.n_bins} bins into {self.n_bins}")
+        counts = self.counts + other.counts
+        delta = other.means - self.means
+        with np.errstate(invalid="ignore", divide="ignore"):
+            other_weight = np.where(counts > 0, other.counts / counts, 0.0)
+        means = self.means + delta * other_weight
+        m2s = self.m2s + other.m2s + delta**2 * self.counts * other_weight
+        return BinnedStats(counts=counts, means=means, m2s=m2s)
+
+    def update(self, bin_ids: np.ndarray, values: np.ndarray) -> "BinnedStats":
+        """Fold a new batch of values into these stats"""
+        return self.merge(BinnedStats.from_values(bin_ids, values, self.n_bins))
+
+
+def assign_bins(values: np.ndarray, breaks: np.ndarray) -> np.ndarray:
+    """Get the index of the [start, end) bin each value falls in,
+    or -1 if it's outside of the breaks"""
+    bin_ids = np.searchsorted(breaks, values, side="right") - 1
+    bin_ids[bin_ids >= len(breaks) - 1] = -1
+    return bin_ids
+
+
+def assign_percentile_bins(values: np.ndarray, n_bins: int = 100) -> np.ndarray:
+    """Bucket values into n_bins equal sized groups by their rank"""
+    values = np.asarray(values)
+    ranks = np.empty(len(values), dtype=np.int64)
+    ranks[np.argsort(values, kind="stable")] = np.arange(len(values))
+    return ranks * n_bins // len(values)
+
+
+def binned_median(bin_ids: np.ndarray, values: np.ndarray, n_bins: int) -> np.ndarray:
+    """Median of the values in each bin (NaN for empty bins), from one sort"""
+    values = np.asarray(values, dtype=float)
+    order = np.lexsort((values, bin_ids))
+    sorted_values = values[order]
+    counts = np.bincount(bin_ids, minlength=n_bins)
+    starts = np.cumsum(counts) - counts
+    has_values = counts > 0
+    lower = starts + np.maximum(counts - 1, 0) // 2
+    upper = starts + counts // 2
+    medians = np.full(n_bins, np.nan)
+    medians[has_values] = (
+        sorted_values[lower[has_values]] + sorted_values[upper[has_values]]
+    ) / 2
+    return medians
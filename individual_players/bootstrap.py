@@ -0,0 +1,170 @@
+# mypy: disable-error-code="arg-type"
+# because there's lots of pandas in here
+from concurrent.futures import ProcessPoolExecutor
+from typing import Literal, NamedTuple
+import dill
+import numpy as np
+import pandas as pd
+
+from .batch_ratings import RatingVariant, get_game_order, run_rating_variants
+from .shared_performances import (
+    SharedPerformances,
+    SharedPerformancesDescriptor,
+    attach_arrays,
+)
+
+
+_Channel = Literal["offense", "defense", "adjusted_offense"]
+
+
+class _BootstrapData(NamedTuple):
+    """Everything a replicate needs, in game order, grouped by resampling unit"""
+
+    player_ids: np.ndarray
+    team_ids: np.ndarray
+    n_possessions: np.ndarray
+    values: np.ndarray
+    unit_starts: np.ndarray
+    unit_counts: np.ndarray
+    all_player_ids: pd.Index
+    variant: RatingVariant
+    channel: _Channel
+
+
+_ROW_FIELDS = ["player_ids", "team_ids", "n_possessions", "values"]
+_UNIT_FIELDS = ["unit_starts", "unit_counts"]
+
+# Set once per worker process, so the data isn't sent with every chunk of replicates
+_worker_data: _BootstrapData | None = None
+
+
+def bootstrap_ratings(
+    performances: pd.DataFrame,
+    variant: RatingVariant,
+    n_replicates: int = 1000,
+    unit: Literal["game", "team_game"] = "game",
+    channel: _Channel = "offense",
+    interval: float = 0.9,
+    seed: int = 0,
+    n_workers: int | None = None,
+    chunk_size: int = 25,
+) -> pd.DataFrame:
+    """Bootstrap intervals for final player ratings
+
+    Resamples games (or team-games) with replacement, keeping them in time order,
+    and reruns the batched rating engine on each resample.
+    Replicates are split across a process pool, which reads the performance
+    arrays from shared memory.
+    The same seed gives the same intervals no matter how many workers there are.
+
+    Returns
+    -------
+    Indexed by player_id: the rating from all of the data (vpp),
+    the empirical percentile interval (lower, upper),
+    and how many replicates the player showed up in.
+    """
+    data = _build_data(performances, variant, unit, channel)
+    full_ratings = getattr(run_rating_variants(performances, [variant]), channel)
+    point = full_ratings.to_data_frame().vpp.reindex(data.all_player_ids).to_numpy()
+
+    replicate_seeds = np.random.SeedSequence(seed).spawn(n_replicates)
+    chunks = [
+        replicate_seeds[i : i + chunk_size] for i in range(0, n_replicates, chunk_size)
+    ]
+    # The arrays go through shared memory, so workers don't each get a copy
+    with SharedPerformances(
+        {name: getattr(data, name) for name in _ROW_FIELDS}
+    ) as rows, SharedPerformances(
+        {name: getattr(data, name) for name in _UNIT_FIELDS}
+    ) as units, ProcessPoolExecutor(
+        max_workers=n_workers,
+        initializer=_set_worker_data,
+        initargs=(
+            rows.descriptor,
+            units.descriptor,
+            dill.dumps((data.all_player_ids, data.variant, data.channel)),
+        ),
+    ) as executor:
+        replicates = np.concatenate(list(executor.map(_run_replicates, chunks)))
+
+    tail = (1 - interval) / 2 * 100
+    lower, upper = np.nanpercentile(replicates, [tail, 100 - tail], axis=0)
+    return pd.DataFrame(
+        {
+            "vpp": point,
+            "lower": lower,
+            "upper": upper,
+            "n_replicates": np.isfinite(replicates).sum(axis=0),
+        },
+        index=pd.Index(data.all_player_ids, name="player_id"),
+    )
+
+
+def _build_data(
+    performances: pd.DataFrame,
+    variant: RatingVariant,
+    unit: Literal["game", "team_game"],
+    channel: _Channel,
+) -> _BootstrapData:
+    ordered = performances.iloc[get_game_order(performances)]
+    unit_columns = ["game_id"] if unit == "game" else ["game_id", "team_id"]
+    # Numbered in time order, since the rows are
+    unit_index = ordered.groupby(unit_columns, sort=False).ngroup().to_numpy()
+    by_unit = np.argsort(unit_index, kind="stable")
+    unit_counts = np.bincount(unit_index)
+    return _BootstrapData(
+        player_ids=ordered.player_id.to_numpy()[by_unit],
+        team_ids=ordered.team_id.to_numpy()[by_unit],
+        n_possessions=ordered.n_possessions.to_numpy()[by_unit],
+        values=ordered["value"].to_numpy()[by_unit],
+        unit_starts=np.cumsum(unit_counts) - unit_counts,
+        unit_counts=unit_counts,
+        all_player_ids=pd.Index(pd.unique(ordered.player_id)),
+        variant=variant,
+        channel=channel,
+    )
+
+
+def _set_worker_data(
+    rows: SharedPerformancesDescriptor,
+    units: SharedPerformancesDescriptor,
+    payload: bytes,
+) -> None:
+    global _worker_data  # pylint: disable=global-statement
+    all_player_ids, variant, channel = dill.loads(payload)
+    _worker_data = _BootstrapData(
+        **attach_arrays(rows),
+        **attach_arrays(units),
+        all_player_ids=all_player_ids,
+        variant=variant,
+        channel=channel,
+    )
+
+
+def _run_replicates(seeds: list[np.random.SeedSequence]) -> np.ndarray:
+    assert _worker_data is not None
+    return np.stack([_run_replicate(_worker_data, seed) for seed in seeds])
+
+
+def _run_replicate(data: _BootstrapData, seed: np.random.SeedSequence) -> np.ndarray:
+    """Final ratings from one resample, lined up with all_player_ids (NaN if missing)"""
+    n_units = len(data.unit_counts)
+    rng = np.random.default_rng(seed)
+    chosen = np.sort(rng.integers(0, n_units, n_units))
+    counts = data.unit_counts[chosen]
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    rows = np.repeat(data.unit_starts[chosen], counts) + offsets
+    resample = pd.DataFrame(
+        {
+            "player_id": data.player_ids[rows],
+            # Each resampled unit is its own game, so repeats aren't merged together
+            "game_id": np.repeat(np.arange(n_units), counts),
+            "team_id": data.team_ids[rows],
+            "n_possessions": data.n_possessions[rows],
+            "value": data.values[rows],
+        }
+    )
+    ratings = getattr(run_rating_variants(resample, [data.variant]), data.channel)
+    replicate = np.full(len(data.all_player_ids), np.nan)
+    replicate[data.all_player_ids.get_indexer(ratings.player_ids)] = ratings.vpp[0]
+    return replicate
@@ -1,4 +1,5 @@
 from .allocation import PossessionAllocationCallbacks
+from .context import TeamGameContext, build_team_game_context
 from .defense import DefenseCallback
 from .defense_adjusting import DefenseAdjustingCallback
 from .defense_adjusted import DefenseAdjustedCallback
@@ -1,33 +1,26 @@
-# mypy: disable-error-code="arg-type,misc"
-# because there's lots of pandas in here
-import pandas as pd
+import numpy as np
 
-from ..allocator import MinutesAllocation, PossessionAllocator
+from ..allocator import PossessionAllocator
+from .context import TeamGameContext
 from .types import TeamCallback, PlayerCallback
-from ..ratings import PlayerRatings, Player
 
 
 class PossessionAllocationCallbacks:
     def __init__(self) -> None:
         self._team_ranks: dict[str, dict[str, int]] = {}
-        self._allocations: list[MinutesAllocation] = []
+        self._possessions_proportions: list[float] = []
+        self._team_vpp_ranks: list[int] = []
 
     @property
     def team_callback(self) -> TeamCallback:
-        def set_pregame_ratings(
-            team_id: str, player_ratings: PlayerRatings, team: pd.DataFrame
-        ):
-            pregame_ratings: dict[str, float] = {
-                player_performance.player_id: player_ratings.get_rating(
-                    Player(player_performance.player_id, team_id)
-                )[0]
-                for player_performance in team.itertuples()
-            }
-            self._team_ranks[team_id] = {
-                pid: i + 1
-                for i, (pid, _) in enumerate(
-                    sorted(pregame_ratings.items(), key=lambda kv: kv[1], reverse=True)
-                )
+        def set_pregame_ratings(context: TeamGameContext):
+            ranked = sorted(
+                zip(context.player_ids, context.pregame_vpp),
+                key=lambda kv: kv[1],
+                reverse=True,
+            )
+            self._team_ranks[context.team_id] = {
+                pid: i + 1 for i, (pid, _) in enumerate(ranked)
             }
 
         return set_pregame_ratings
@@ -36,15 +29,15 @@ class PossessionAllocationCallbacks:
     def player_callback(self) -> PlayerCallback:
         def add_allocation(team_id: str, player_performance):
             team_rank = self._team_ranks[team_id][player_performance.player_id]
-            self._allocations.append(
-                MinutesAllocation(
-                    possessions_proportion=player_performance.possessions_proportion,
-                    team_vpp_rank=team_rank,
-                )
+            self._possessions_proportions.append(
+                player_performance.possessions_proportion
             )
+            self._team_vpp_ranks.append(team_rank)
 
         return add_allocation
 
     @property
     def allocator(self) -> PossessionAllocator:
-        return PossessionAllocator(self._allocations)
+        return PossessionAllocator.from_ranks(
+            np.array(self._possessions_proportions), np.array(self._team_vpp_ranks)
+        )
@@ -0,0 +1,79 @@
+from typing import NamedTuple
+import numpy as np
+import pandas as pd
+
+from ..ratings import PlayerRatings, Player
+
+
+class TeamGameContext(NamedTuple):
+    """Everything callbacks need about one team's side of a game,
+    computed once by update_loop before any of them run"""
+
+    team_id: str
+    # None if the performances don't have an opponent_id column
+    opponent_id: str | None
+    team: pd.DataFrame
+    player_ids: np.ndarray
+    n_possessions: np.ndarray
+    total_possessions: float
+    vpp: float
+    # Offensive ratings going into the game, in the same order as team
+    pregame_vpp: np.ndarray
+    pregame_vpp_var: np.ndarray
+    # What the team's VPP should've been given the pregame ratings
+    expected_vpp: float
+    # Each of the performances' *_sd columns (ex: defense_sd), for the team's rows
+    sds: dict[str, np.ndarray]
+
+    @property
+    def vs_expectation(self) -> float:
+        return self.vpp - self.expected_vpp
+
+    def require_opponent_id(self) -> str:
+        """opponent_id, for callbacks that can't work without one"""
+        if self.opponent_id is None:
+            raise ValueError("The performances need an opponent_id column")
+        return self.opponent_id
+
+    def weighted_average(self, player_values: np.ndarray) -> float:
+        """Average of a value for each player (in the same order as team),
+        weighted by their possessions"""
+        return float(np.dot(player_values, self.n_possessions) / self.total_possessions)
+
+
+def build_team_game_context(
+    team_id: str,
+    team: pd.DataFrame,
+    player_ratings: PlayerRatings,
+    sd_columns: dict[str, np.ndarray] | None = None,
+) -> TeamGameContext:
+    """sd_columns are whole columns of the performances (ex: from update_loop),
+    indexed by position, so team's index has to be positions in them"""
+    opponent_id = None
+    if "opponent_id" in team:
+        opponent_ids = team.opponent_id.unique()
+        assert len(opponent_ids) == 1
+        opponent_id = opponent_ids.item()
+
+    player_ids = team.player_id.to_numpy()
+    n_possessions = team.n_possessions.to_numpy()
+    total_possessions = n_possessions.sum()
+    pregame_vpp, pregame_vpp_var = np.array(
+        [player_ratings.get_rating(Player(pid, team_id)) for pid in player_ids]
+    ).T
+    return TeamGameContext(
+        team_id=team_id,
+        opponent_id=opponent_id,
+        team=team,
+        player_ids=player_ids,
+        n_possessions=n_possessions,
+        total_possessions=total_possessions,
+        vpp=team["value"].to_numpy().sum() / total_possessions,
+        pregame_vpp=pregame_vpp,
+        pregame_vpp_var=pregame_vpp_var,
+        expected_vpp=np.dot(pregame_vpp, n_possessions) / total_possessions,
+        sds={
+            name: column[team.index.to_numpy()]
+            for name, column in (sd_columns or {}).items()
+        },
+    )
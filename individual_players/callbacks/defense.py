@@ -1,62 +1,50 @@
 # mypy: disable-error-code="arg-type,operator,misc"
 # because there's lots of pandas in here
-from typing import NamedTuple
 import pandas as pd
 
+from .context import TeamGameContext
 from .types import TeamCallback, PlayerCallback
-from ..ratings import PlayerRatings, Player
-
-
-class _DefensivePerformance(NamedTuple):
-    player_id: str
-    n_possessions: float
-    opponent_vs_expectation: float
+from ..columnar import ColumnarBuffer
 
 
 class DefenseCallback:
-    def __init__(self) -> None:
-        # team -> VPP in most recent game
-        # We're just banking on the callbacks being called back to back
-        self._performances: dict[str, float] = {}
-        self._defensive_performances: list[_DefensivePerformance] = []
+    def __init__(self, spill_dir: str | None = None) -> None:
+        self._defensive_performances = ColumnarBuffer(
+            {
+                "player_id": None,
+                "n_possessions": float,
+                "opponent_vs_expectation": float,
+            },
+            spill_dir=spill_dir,
+        )
+
+    def close(self) -> None:
+        """Delete any performances that were spilled to disk"""
+        self._defensive_performances.close()
 
     @property
     def team_callback(self) -> TeamCallback:
-        def store_game_performance(
-            _: str, player_ratings: PlayerRatings, team: pd.DataFrame
-        ):
-            opponent_ids = team.opponent_id.unique()
-            assert len(opponent_ids) == 1
-            opponent_id = opponent_ids.item()
-            vpp = team.value.sum() / team.n_possessions.sum()
-            expected_vpp = (
-                sum(
-                    player_ratings.get_rating(Player(p.player_id, p.team_id))[0]
-                    * p.n_possessions
-                    for p in team.itertuples()
-                )
-                / team.n_possessions.sum()
+        def store_results(context: TeamGameContext):
+            self._defensive_performances.extend(
+                context.player_ids,
+                context.n_possessions,
+                [context.vs_expectation] * len(context.player_ids),
             )
-            self._performances[opponent_id] = vpp - expected_vpp
 
-        return store_game_performance
+        return store_results
 
     @property
     def player_callback(self) -> PlayerCallback:
-        def store_result(_: str, player_performance):
-            opp_performance = self._performances[player_performance.opponent_id]
-            self._defensive_performances.append(
-                _DefensivePerformance(
-                    player_id=player_performance.player_id,
-                    n_possessions=player_performance.n_possessions,
-                    opponent_vs_expectation=opp_performance,
-                )
-            )
+        """Does nothing, everything's done a team at a time in team_callback.
+        Still here so older update_loop calls (ex: in the notebooks) work."""
+
+        def do_nothing(_: str, __):
+            pass
 
-        return store_result
+        return do_nothing
 
     @property
     def defensive_performances(self) -> pd.DataFrame:
-        return pd.DataFrame(self._defensive_performances).rename(
+        return self._defensive_performances.to_data_frame().rename(
             columns={"opponent_vs_expectation": "value"}
         )
@@ -1,11 +1,10 @@
 from collections import defaultdict
+import numpy as np
 import pandas as pd
 
-from individual_players.priors.types import Player
-
+from .context import TeamGameContext
 from .types import TeamCallback, PlayerCallback
 from ..types import RatingsLookup
-from ..ratings import PlayerRatings
 from ..league_model import LeagueModel
 
 
@@ -22,7 +21,6 @@ class DefenseAdjustedCallback:
         self._defense_ratings: RatingsLookup = defaultdict(
             lambda: (defense_model.vpp_mean, defense_model.vpp_variance)
         )
-        self._defense_adjustment: dict[str, float] = {}
 
         self._adjusted_offense_rating: RatingsLookup = defaultdict(
             lambda: (
@@ -41,24 +39,22 @@ class DefenseAdjustedCallback:
 
     @property
     def team_callback(self) -> TeamCallback:
-        def store_defense_adjustment(
-            _: str, player_ratings: PlayerRatings, team: pd.DataFrame
-        ):
-            opponent_id = _get_opponent_id(team)
-            self._defensive_performances[opponent_id] = _get_defensive_difference(
-                team, player_ratings
-            )
-            self._get_defensive_adjustment(opponent_id, team)
+        def store_defense_adjustment(context: TeamGameContext):
+            opponent_id = context.require_opponent_id()
+            self._defensive_performances[opponent_id] = context.vs_expectation
+            self._update_team(context)
 
         return store_defense_adjustment
 
     @property
     def player_callback(self) -> PlayerCallback:
-        def store_result(_: str, player_performance):
-            self._update_defense_rating(player_performance)
-            self._update_adjusted_offensive_rating(player_performance)
+        """Does nothing, everything's done a team at a time in team_callback.
+        Still here so older update_loop calls (ex: in the notebooks) work."""
+
+        def do_nothing(_: str, __):
+            pass
 
-        return store_result
+        return do_nothing
 
     @property
     def defensive_performances(self) -> pd.DataFrame:
@@ -66,69 +62,56 @@ class DefenseAdjustedCallback:
             columns={"opponent_vs_expectation": "value"}
         )
 
-    def _update_defense_rating(self, player_performance):
-        opp_performance = self._defensive_performances[player_performance.opponent_id]
-        defense_mu, defense_var = self._defense_ratings[player_performance.player_id]
-        self._defense_ratings[player_performance.player_id] = _update_rating(
-            defense_mu, defense_var, opp_performance, player_performance.defense_sd
+    def _update_team(self, context: TeamGameContext) -> None:
+        """Update the players' defense ratings with the team's result,
+        and their adjusted offense ratings with their offense
+        adjusted by their (pregame) defense"""
+        player_ids = context.player_ids.tolist()
+        defense_vpp, defense_var = np.array(
+            [self._defense_ratings[pid] for pid in player_ids]
+        ).T
+        defense_adjustment = context.weighted_average(defense_vpp)
+        new_defense = _update_ratings(
+            defense_vpp,
+            defense_var,
+            context.vs_expectation,
+            context.sds["defense_sd"],
         )
 
-    def _get_defensive_adjustment(self, opponent_id: str, team) -> None:
-        total_possessions = team.n_possessions.sum()
-        weighted_adjustment = (
-            sum(
-                self._defense_ratings[p.player_id][0] * p.n_possessions
-                for p in team.itertuples()
-            )
-            / total_possessions
-        )
-        self._defense_adjustment[opponent_id] = weighted_adjustment
-
-    def _update_adjusted_offensive_rating(self, player_performance):
-        rating = self._adjusted_offense_rating[player_performance.player_id]
-        defense_adjustment = self._defense_adjustment[player_performance.opponent_id]
-
+        offense_vpp, offense_var = np.array(
+            [self._adjusted_offense_rating[pid] for pid in player_ids]
+        ).T
         # TODO: double check the sign here
-        adjusted_performance = (
-            player_performance.value / player_performance.n_possessions
+        adjusted_performances = (
+            context.team["value"].to_numpy() / context.n_possessions
             - defense_adjustment
         )
-        new_value = _update_rating(
-            *rating,
-            adjusted_performance,
-            player_performance.adjusted_vpp_sd,
+        new_offense = _update_ratings(
+            offense_vpp,
+            offense_var,
+            adjusted_performances,
+            context.sds["adjusted_vpp_sd"],
         )
-        if pd.isna(new_value) and player_performance.player_id == 4398907:
-            print("pause")
-        self._adjusted_offense_rating[player_performance.player_id] = new_value
 
-
-# TODO: DRY with the loop?3
-def _update_rating(
-    player_mu: float, player_var: float, game_value: float, value_std: float
-) -> tuple[float, float]:
-    # Rating Update
-    new_mu = (player_mu * (value_std**2) + game_value * player_var) / (
-        (value_std**2) + player_var
-    )
-    new_var = 1 / ((1 / player_var + 1 / (value_std**2)))
-    return new_mu, new_var
-
-
-def _get_opponent_id(team) -> str:
-    opponent_ids = team.opponent_id.unique()
-    assert len(opponent_ids) == 1
-    return opponent_ids.item()
+        for player_id, defense, offense in zip(
+            player_ids,
+            zip(*(ratings.tolist() for ratings in new_defense)),
+            zip(*(ratings.tolist() for ratings in new_offense)),
+        ):
+            self._defense_ratings[player_id] = defense
+            self._adjusted_offense_rating[player_id] = offense
 
 
-def _get_defensive_difference(team, player_ratings: PlayerRatings) -> float:
-    vpp = team.value.sum() / team.n_possessions.sum()
-    expected_vpp = (
-        sum(
-            player_ratings.get_rating(Player(p.player_id, p.team_id))[0]
-            * p.n_possessions
-            for p in team.itertuples()
-        )
-        / team.n_possessions.sum()
+# TODO: DRY with the loop?3
+def _update_ratings(
+    player_mus: np.ndarray,
+    player_vars: np.ndarray,
+    game_values: float | np.ndarray,
+    value_stds: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+    # Rating Update, for a team's players at once
+    new_mus = (player_mus * (value_stds**2) + game_values * player_vars) / (
+        (value_stds**2) + player_vars
     )
-    return vpp - expected_vpp
+    new_vars = 1 / ((1 / player_vars + 1 / (value_stds**2)))
+    return new_mus, new_vars
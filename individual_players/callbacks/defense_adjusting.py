@@ -1,25 +1,20 @@
-from collections import defaultdict
-from typing import NamedTuple
+import numpy as np
 import pandas as pd
 
+from .context import TeamGameContext
 from .types import TeamCallback, PlayerCallback
-from ..types import RatingsLookup
+from ..columnar import ColumnarBuffer
 from ..ratings import PlayerRatings, Player
 from ..league_model import LeagueModel
 from ..priors import get_simple_prior, PriorGetter
 
 
-class _DefensiveAdjustedPerformance(NamedTuple):
-    player_id: str
-    n_possessions: float
-    adjusted_performance: float
-
-
 class DefenseAdjustingCallback:
     def __init__(
         self,
         defense_model: LeagueModel,
         prior_getter: PriorGetter | None = None,
+        spill_dir: str | None = None,
     ):
         self._defense_model = defense_model
 
@@ -29,9 +24,15 @@ class DefenseAdjustingCallback:
             prior_getter = get_simple_prior(defense_model)
 
         self._defense_ratings = PlayerRatings(prior_getter)
-        self._defense_adjustment: dict[str, float] = {}
 
-        self._adjusted_offensive_performances: list[_DefensiveAdjustedPerformance] = []
+        self._adjusted_offensive_performances = ColumnarBuffer(
+            {"player_id": None, "n_possessions": float, "adjusted_performance": float},
+            spill_dir=spill_dir,
+        )
+
+    def close(self) -> None:
+        """Delete any performances that were spilled to disk"""
+        self._adjusted_offensive_performances.close()
 
     @property
     def defense_ratings(self) -> PlayerRatings:
@@ -39,24 +40,22 @@ class DefenseAdjustingCallback:
 
     @property
     def team_callback(self) -> TeamCallback:
-        def store_defense_adjustment(
-            _: str, player_ratings: PlayerRatings, team: pd.DataFrame
-        ):
-            opponent_id = _get_opponent_id(team)
-            self._defensive_performances[opponent_id] = _get_defensive_difference(
-                team, player_ratings
-            )
-            self._get_defensive_adjustment(opponent_id, team)
+        def store_defense_adjustment(context: TeamGameContext):
+            opponent_id = context.require_opponent_id()
+            self._defensive_performances[opponent_id] = context.vs_expectation
+            self._update_team(context)
 
         return store_defense_adjustment
 
     @property
     def player_callback(self) -> PlayerCallback:
-        def store_result(_: str, player_performance):
-            self._update_defense_rating(player_performance)
-            self._store_adjusted_offensive_performance(player_performance)
+        """Does nothing, everything's done a team at a time in team_callback.
+        Still here so older update_loop calls (ex: in the notebooks) work."""
+
+        def do_nothing(_: str, __):
+            pass
 
-        return store_result
+        return do_nothing
 
     @property
     def defensive_performances(self) -> pd.DataFrame:
@@ -66,72 +65,51 @@ class DefenseAdjustingCallback:
             columns={"opponent_vs_expectation": "value"}
         )
 
-    def _update_defense_rating(self, player_performance):
-        opp_performance = self._defensive_performances[player_performance.opponent_id]
-        defense_mu, defense_var = self._defense_ratings.get_rating(Player(player_performance.player_id, player_performance.team_id))
-        new_rating = _update_rating(
-            defense_mu, defense_var, opp_performance, player_performance.defense_sd
+    def _update_team(self, context: TeamGameContext):
+        """Update the players' defense ratings with the team's result, and store
+        their offense adjusted by their (pregame) defense"""
+        defense_vpp, defense_var = np.array(
+            [
+                self._defense_ratings.get_rating(Player(pid, context.team_id))
+                for pid in context.player_ids
+            ]
+        ).T
+        defense_adjustment = context.weighted_average(defense_vpp)
+        new_vpp, new_var = _update_ratings(
+            defense_vpp,
+            defense_var,
+            context.vs_expectation,
+            context.sds["defense_sd"],
         )
-        self._defense_ratings.update_rating(player_performance.player_id, new_rating)
-
-    def _get_defensive_adjustment(self, opponent_id: str, team):
-        total_possessions = team.n_possessions.sum()
-        weighted_adjustment = (
-            sum(
-                self._defense_ratings.get_rating(Player(p.player_id, p.team_id))[0] * p.n_possessions
-                for p in team.itertuples()
-            )
-            / total_possessions
-        )
-        self._defense_adjustment[opponent_id] = weighted_adjustment
+        for player_id, rating in zip(
+            context.player_ids.tolist(), zip(new_vpp.tolist(), new_var.tolist())
+        ):
+            self._defense_ratings.update_rating(player_id, rating)
 
-    def _store_adjusted_offensive_performance(self, player_performance):
-        defense_adjustment = self._defense_adjustment[player_performance.opponent_id]
-        adjusted_performance = (
-            player_performance.value / player_performance.n_possessions
-            - defense_adjustment
-        )
-        self._adjusted_offensive_performances.append(
-            _DefensiveAdjustedPerformance(
-                n_possessions=player_performance.n_possessions,
-                player_id=player_performance.player_id,
-                adjusted_performance=adjusted_performance,
-            )
+        self._adjusted_offensive_performances.extend(
+            context.player_ids,
+            context.n_possessions,
+            context.team["value"].to_numpy() / context.n_possessions
+            - defense_adjustment,
         )
 
     @property
     def adjusted_performances(self) -> pd.DataFrame:
-        return pd.DataFrame(self._adjusted_offensive_performances).rename(
+        return self._adjusted_offensive_performances.to_data_frame().rename(
             columns={"adjusted_performance": "value"}
         )
 
 
 # TODO: DRY with the loop?3
-def _update_rating(
-    player_mu: float, player_var: float, game_value: float, value_std: float
-) -> tuple[float, float]:
-    # Rating Update
-    new_mu = (player_mu * (value_std**2) + game_value * player_var) / (
-        (value_std**2) + player_var
-    )
-    new_var = 1 / ((1 / player_var + 1 / (value_std**2)))
-    return new_mu, new_var
-
-
-def _get_opponent_id(team) -> str:
-    opponent_ids = team.opponent_id.unique()
-    assert len(opponent_ids) == 1
-    return opponent_ids.item()
-
-
-def _get_defensive_difference(team, player_ratings: PlayerRatings) -> float:
-    vpp = team.value.sum() / team.n_possessions.sum()
-    expected_vpp = (
-        sum(
-            player_ratings.get_rating(Player(p.player_id, p.team_id))[0]
-            * p.n_possessions
-            for p in team.itertuples()
-        )
-        / team.n_possessions.sum()
+def _update_ratings(
+    player_mus: np.ndarray,
+    player_vars: np.ndarray,
+    game_value: float,
+    value_stds: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+    # Rating Update, for a team's players at once
+    new_mus = (player_mus * (value_stds**2) + game_value * player_vars) / (
+        (value_stds**2) + player_vars
     )
-    return vpp - expected_vpp
+    new_vars = 1 / ((1 / player_vars + 1 / (value_stds**2)))
+    return new_mus, new_vars
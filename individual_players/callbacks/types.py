@@ -1,7 +1,7 @@
 from typing import Callable
 import pandas as pd
 
-from ..ratings import PlayerRatings
+from .context import TeamGameContext
 
-TeamCallback = Callable[[str, PlayerRatings, pd.DataFrame], None]
+TeamCallback = Callable[[TeamGameContext], None]
 PlayerCallback = Callable[[str, pd.Series], None]
@@ -0,0 +1,139 @@
+import shutil
+import tempfile
+import weakref
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+
+class ColumnarBuffer:
+    """Append-only table that stores each column in preallocated numpy chunks
+
+    Used by callbacks that produce one row per player-game,
+    so a full run doesn't hold millions of small Python objects.
+
+    Parameters
+    ----------
+    columns
+        Column name -> dtype. A dtype of None means it's picked
+        from the first value appended (object for anything but numbers)
+    chunk_size, optional
+        Number of rows in each chunk
+    spill_dir, optional
+        If set, full chunks are written to .npy files in a new folder
+        under this directory instead of being kept in memory.
+        The folder is deleted by close, or when the buffer is garbage collected.
+    """
+
+    def __init__(
+        self,
+        columns: dict[str, np.dtype | type | str | None],
+        chunk_size: int = 2**16,
+        spill_dir: str | None = None,
+    ) -> None:
+        self._names = list(columns)
+        self._dtypes = list(columns.values())
+        self._chunk_size = chunk_size
+        self._chunk: list[np.ndarray] = []
+        self._n_in_chunk = 0
+        self._full_chunks: list[list[np.ndarray]] = []
+        self._spill_dir = (
+            Path(tempfile.mkdtemp(dir=spill_dir)) if spill_dir is not None else None
+        )
+        self._n_spilled = 0
+        # So the folder doesn't outlive the buffer if nobody calls close
+        self._remove_spill_dir = (
+            weakref.finalize(self, shutil.rmtree, self._spill_dir, True)
+            if self._spill_dir is not None
+            else None
+        )
+
+    def __len__(self) -> int:
+        n_full = len(self._full_chunks) + self._n_spilled
+        return n_full * self._chunk_size + self._n_in_chunk
+
+    def append(self, *values) -> None:
+        """Add a row, with values in the same order as the columns"""
+        if not self._chunk:
+            self._chunk = self._allocate_chunk(values)
+        for column, value in zip(self._chunk, values):
+            column[self._n_in_chunk] = value
+        self._n_in_chunk += 1
+        if self._n_in_chunk == self._chunk_size:
+            self._finish_chunk()
+
+    def extend(self, *columns) -> None:
+        """Add rows from arrays, one for each column, in the same order as the columns"""
+        columns = tuple(np.asarray(column) for column in columns)
+        n_rows = len(columns[0]) if columns else 0
+        start = 0
+        while start < n_rows:
+            if not self._chunk:
+                self._chunk = self._allocate_chunk(
+                    tuple(column[start] for column in columns)
+                )
+            n_added = min(self._chunk_size - self._n_in_chunk, n_rows - start)
+            end = self._n_in_chunk + n_added
+            for chunk_column, column in zip(self._chunk, columns):
+                chunk_column[self._n_in_chunk : end] = column[start : start + n_added]
+            self._n_in_chunk = end
+            start += n_added
+            if self._n_in_chunk == self._chunk_size:
+                self._finish_chunk()
+
+    def to_data_frame(self) -> pd.DataFrame:
+        chunks = [self._load_spilled(i) for i in range(self._n_spilled)]
+        chunks += self._full_chunks
+        if self._n_in_chunk:
+            chunks.append([column[: self._n_in_chunk] for column in self._chunk])
+        if not chunks:
+            return pd.DataFrame(columns=self._names)
+        return pd.DataFrame(
+            {
+                name: np.concatenate([chunk[i] for chunk in chunks])
+                for i, name in enumerate(self._names)
+            }
+        )
+
+    def close(self) -> None:
+        """Delete any chunks that were written to disk"""
+        if self._remove_spill_dir is not None:
+            self._remove_spill_dir()
+            self._n_spilled = 0
+
+    def _allocate_chunk(self, first_row: tuple) -> list[np.ndarray]:
+        if self._dtypes and any(dtype is None for dtype in self._dtypes):
+            self._dtypes = [
+                _infer_dtype(value) if dtype is None else dtype
+                for dtype, value in zip(self._dtypes, first_row)
+            ]
+        return [np.empty(self._chunk_size, dtype=dtype) for dtype in self._dtypes]
+
+    def _finish_chunk(self) -> None:
+        if self._spill_dir is None:
+            self._full_chunks.append(self._chunk)
+        else:
+            for name, column in zip(self._names, self._chunk):
+                np.save(self._spill_path(name, self._n_spilled), column)
+            self._n_spilled += 1
+        self._chunk = []
+        self._n_in_chunk = 0
+
+    def _load_spilled(self, chunk_number: int) -> list[np.ndarray]:
+        return [
+            np.load(
+                self._spill_path(name, chunk_number),
+                mmap_mode=None if dtype == object else "r",
+                allow_pickle=dtype == object,
+            )
+            for name, dtype in zip(self._names, self._dtypes)
+        ]
+
+    def _spill_path(self, name: str, chunk_number: int) -> Path:
+        assert self._spill_dir is not None
+        return self._spill_dir / f"{name}_{chunk_number:06d}.npy"
+
+
+def _infer_dtype(value) -> np.dtype:
+    dtype = np.asarray(value).dtype
+    return dtype if dtype.kind in "biuf" else np.dtype(object)
@@ -0,0 +1,71 @@
+"""Per-row sds (ex: vpp_sd) saved next to the performance data,
+so they're only computed once for each version of the data and the models"""
+import hashlib
+import os
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+from .league_model import LeagueModel
+
+
+_DERIVED_DIR = Path(__file__).parent.parent / "data" / "derived"
+
+
+def load_sd_columns(
+    performances: pd.DataFrame,
+    model_paths: dict[str, str | Path],
+    name: str,
+    cache_dir: str | Path = _DERIVED_DIR,
+) -> dict[str, np.ndarray]:
+    """Each model's possessions_to_vpp_std for every row, as float arrays
+
+    Each column is saved in cache_dir as a .npy file, keyed by a hash of the
+    n_possessions (all the sds depend on) and of the model's file,
+    so it's only recomputed when one of those changes.
+
+    Parameters
+    ----------
+    performances
+        Needs an n_possessions column. The arrays are in its row order.
+    model_paths
+        Column name -> saved LeagueModel (ex: {"vpp_sd": "models/mens.pkl"})
+    name
+        Starts the files' names (ex: the league). Older versions of a name's
+        column are deleted when a new one is saved.
+    cache_dir, optional
+        Where the files go (default: data/derived)
+    """
+    cache_dir = Path(cache_dir)
+    n_possessions = performances.n_possessions.to_numpy(dtype=float)
+    data_hash = _hash_bytes(n_possessions.tobytes())
+    columns = {}
+    for column, model_path in model_paths.items():
+        prefix = f"{name}_{column}_"
+        model_hash = _hash_bytes(Path(model_path).read_bytes())
+        path = cache_dir / f"{prefix}{data_hash}_{model_hash}.npy"
+        if path.exists():
+            columns[column] = np.load(path, allow_pickle=False)
+            continue
+        model = LeagueModel.load(str(model_path))
+        columns[column] = np.asarray(
+            model.possessions_to_vpp_std(n_possessions), dtype=float
+        )
+        _save(path, columns[column])
+        for stale in cache_dir.glob(f"{prefix}*.npy"):
+            if stale != path:
+                stale.unlink(missing_ok=True)
+    return columns
+
+
+def _hash_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def _save(path: Path, values: np.ndarray) -> None:
+    """Swapped in all at once, in case another process is reading it"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(temp_path, "wb") as file:
+        np.save(file, values)
+    temp_path.replace(path)
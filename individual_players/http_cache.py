@@ -0,0 +1,118 @@
+import asyncio
+import hashlib
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+from types import TracebackType
+import aiohttp
+
+
+# Worth trying again, anything else is the page's final answer
+_RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CachedClient:
+    """GETs through one keep-alive connection pool, with retries and an on-disk cache
+
+    Use it as an async context manager (so the pool gets closed).
+
+    Parameters
+    ----------
+    cache_dir
+        Where response bodies are saved, one file per URL
+    ttl_seconds, optional
+        How long a cached response is good for. None means forever.
+    per_host_limit, optional
+        Most requests in flight to one host at a time
+    max_retries, optional
+        How many times to retry a connection error, timeout, 429 or 5xx
+    backoff_seconds, optional
+        Wait before the first retry, doubling (plus jitter) each time after
+    timeout_seconds, optional
+        Total time allowed for one attempt
+    """
+
+    def __init__(
+        self,
+        cache_dir: str | Path,
+        ttl_seconds: float | None = None,
+        per_host_limit: int = 10,
+        max_retries: int = 4,
+        backoff_seconds: float = 0.5,
+        timeout_seconds: float = 30,
+    ) -> None:
+        self._cache_dir = Path(cache_dir)
+        self._ttl_seconds = ttl_seconds
+        self._per_host_limit = per_host_limit
+        self._max_retries = max_retries
+        self._backoff_seconds = backoff_seconds
+        self._timeout = aiohttp.ClientTimeout(total=timeout_seconds)
+        self._session: aiohttp.ClientSession | None = None
+
+    async def __aenter__(self) -> "CachedClient":
+        self._cache_dir.mkdir(parents=True, exist_ok=True)
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit_per_host=self._per_host_limit),
+            timeout=self._timeout,
+        )
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def get(self, url: str) -> bytes:
+        """The body of a 200 response, from the cache if it's fresh enough
+
+        Raises aiohttp.ClientResponseError for other statuses
+        (after retrying the ones in _RETRY_STATUSES)
+        """
+        cache_path = self._get_cache_path(url)
+        if self._is_fresh(cache_path):
+            return cache_path.read_bytes()
+        data = await self._fetch(url)
+        _write_atomically(cache_path, data)
+        return data
+
+    async def _fetch(self, url: str) -> bytes:
+        if self._session is None:
+            raise RuntimeError("Use CachedClient with `async with` before calling get")
+        for attempt in range(self._max_retries + 1):
+            is_last = attempt == self._max_retries
+            try:
+                async with self._session.get(url) as response:
+                    if response.status not in _RETRY_STATUSES or is_last:
+                        response.raise_for_status()
+                        return await response.read()
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if is_last:
+                    raise
+            delay = self._backoff_seconds * 2**attempt
+            await asyncio.sleep(delay + random.uniform(0, delay))
+        raise AssertionError("The last attempt always returns or raises")
+
+    def _get_cache_path(self, url: str) -> Path:
+        key = hashlib.sha256(url.encode()).hexdigest()
+        return self._cache_dir / key[:2] / key
+
+    def _is_fresh(self, cache_path: Path) -> bool:
+        try:
+            modified = cache_path.stat().st_mtime
+        except FileNotFoundError:
+            return False
+        return self._ttl_seconds is None or time.time() - modified < self._ttl_seconds
+
+
+def _write_atomically(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=path.parent, delete=False) as file:
+        file.write(data)
+    os.replace(file.name, path)
@@ -0,0 +1,124 @@
+# mypy: disable-error-code="arg-type"
+# because there's lots of pandas in here
+from inspect import signature
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.linalg import cg
+
+from .league_model import LeagueModel
+
+
+# scipy renamed cg's tol to rtol
+_CG_TOLERANCE_ARG = "rtol" if "rtol" in signature(cg).parameters else "tol"
+
+
+def solve_joint_ratings(
+    performances: pd.DataFrame,
+    model: LeagueModel,
+    defense_model: LeagueModel,
+    tolerance: float = 1e-10,
+    max_iterations: int | None = None,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Solve for every player's offensive and defensive rating at once,
+    instead of the game by game chain of DefenseAdjustingCallback/DefenseAdjustedCallback
+
+    Each row's VPP is modeled as the player's offense rating
+    plus the possession-weighted average defense rating of the opponent's players
+    (positive defense = allowing more VPP, like the callbacks).
+    Rows are weighted by 1 / model.possessions_to_vpp_std(n_possessions) ** 2,
+    and the models' means and variances act as ridge priors,
+    so it's the posterior mean if everything were known at once
+    (a retrospective rating, not what anybody knew going into a game).
+
+    Needs an opponent_id column (from build_combined_df).
+
+    Returns
+    -------
+    Offense and defense ratings, indexed by player_id, with vpp and vpp_var columns.
+    vpp_var is 1 / the diagonal of the precision matrix,
+    which ignores the covariance between ratings, so it's a bit too small.
+    """
+    player_index, player_ids = pd.factorize(performances.player_id)
+    n_players = len(player_ids)
+    n_rows = len(performances)
+    n_possessions = performances.n_possessions.to_numpy()
+
+    team_game_index = (
+        performances.groupby(["game_id", "team_id"], sort=False).ngroup().to_numpy()
+    )
+    n_team_games = team_game_index.max() + 1
+    opponent_team_game = _get_opponent_team_games(performances, team_game_index)
+
+    team_possessions = np.bincount(
+        team_game_index, weights=n_possessions, minlength=n_team_games
+    )
+    # (team-game x player) share of the team's possessions
+    possession_shares = sparse.csr_matrix(
+        (
+            n_possessions / team_possessions[team_game_index],
+            (team_game_index, player_index),
+        ),
+        shape=(n_team_games, n_players),
+    )
+    row_to_opponent = sparse.csr_matrix(
+        (np.ones(n_rows), (np.arange(n_rows), opponent_team_game[team_game_index])),
+        shape=(n_rows, n_team_games),
+    )
+    offense_design = sparse.csr_matrix(
+        (np.ones(n_rows), (np.arange(n_rows), player_index)),
+        shape=(n_rows, n_players),
+    )
+    design = sparse.hstack(
+        [offense_design, row_to_opponent @ possession_shares], format="csr"
+    )
+
+    row_weights = 1 / np.asarray(model.possessions_to_vpp_std(n_possessions)) ** 2
+    vpp = performances["value"].to_numpy() / n_possessions
+    prior_means = np.repeat([model.vpp_mean, defense_model.vpp_mean], n_players)
+    prior_precisions = np.repeat(
+        [1 / model.vpp_variance, 1 / defense_model.vpp_variance], n_players
+    )
+
+    weighted_design = design.T.multiply(row_weights).tocsr()
+    precision = (weighted_design @ design + sparse.diags(prior_precisions)).tocsr()
+    target = weighted_design @ vpp + prior_precisions * prior_means
+    diagonal = precision.diagonal()
+
+    ratings, info = cg(
+        precision,
+        target,
+        x0=prior_means,
+        M=sparse.diags(1 / diagonal),
+        maxiter=max_iterations,
+        **{_CG_TOLERANCE_ARG: tolerance},
+    )
+    if info != 0:
+        raise RuntimeError(f"Joint ratings didn't converge (cg info={info})")
+
+    def _to_data_frame(columns: slice) -> pd.DataFrame:
+        return pd.DataFrame(
+            {"vpp": ratings[columns], "vpp_var": 1 / diagonal[columns]},
+            index=pd.Index(player_ids, name="player_id"),
+        )
+
+    return _to_data_frame(slice(0, n_players)), _to_data_frame(slice(n_players, None))
+
+
+def _get_opponent_team_games(
+    performances: pd.DataFrame, team_game_index: np.ndarray
+) -> np.ndarray:
+    """For each team-game number, the team-game number of their opponent"""
+    _, first_rows = np.unique(team_game_index, return_index=True)
+    game_ids = performances.game_id.to_numpy()[first_rows]
+    team_games = pd.MultiIndex.from_arrays(
+        [game_ids, performances.team_id.to_numpy()[first_rows]]
+    )
+    opponent_team_game = team_games.get_indexer(
+        pd.MultiIndex.from_arrays(
+            [game_ids, performances.opponent_id.to_numpy()[first_rows]]
+        )
+    )
+    if (opponent_team_game < 0).any():
+        raise ValueError("Every team-game needs an opponent with performances too")
+    return opponent_team_game
@@ -4,59 +4,104 @@ from typing import NamedTuple, Callable, TypeVar, Union, Self
 import dill
 import numpy as np
 import pandas as pd
-import statsmodels.api as sm
+
+from .binned_stats import BinnedStats, assign_percentile_bins, binned_median
 
 _NumericType = TypeVar(
     "_NumericType", bound=Union[int, float, complex, str, bytes, np.generic]
 )
 _VppStdModel = Callable[[_NumericType], _NumericType]
 
+# Only players with reasonable sample sizes are used for fitting
+MIN_CAREER_GAMES = 15
+MIN_CAREER_POSSESSIONS = 100
+
 
-def _get_player_averages(performances: pd.DataFrame) -> pd.DataFrame:
+def _get_player_averages(
+    performances: pd.DataFrame,
+) -> tuple[pd.DataFrame, np.ndarray, np.ndarray]:
     """Get career averages for all players,
     limiting to only players with reasonable sample sizes
-    becuase I'm using this for fitting the game | career model"""
-    by_player = (
-        performances.groupby("player_id")
-        .agg(
-            {
-                "value": [("total_value", "sum")],  # type: ignore[list-item]
-                "n_possessions": [("n_games", "count"), ("total_possessions", "sum")],  # type: ignore[list-item]
-            }
-        )
-        .reset_index()
+    becuase I'm using this for fitting the game | career model
+
+    Also returns each row's index into the (unfiltered) players
+    and which of those players are the reasonable ones,
+    so the totals can be broadcast back to the rows without a merge."""
+    player_index, player_ids = pd.factorize(performances.player_id, sort=True)
+    n_players = len(player_ids)
+    by_player = pd.DataFrame(
+        {
+            "player_id": player_ids,
+            "total_value": np.bincount(
+                player_index, weights=performances["value"], minlength=n_players
+            ),
+            "n_games": np.bincount(player_index, minlength=n_players),
+            "total_possessions": np.bincount(
+                player_index, weights=performances.n_possessions, minlength=n_players
+            ),
+        }
     )
-    other_columns = by_player.columns.get_level_values(1).tolist()[1:]
-    by_player.columns = ["player_id"] + other_columns  # type: ignore[assignment]
-
-    # Reasonable # of games
-    by_player = by_player[by_player.n_games > 15]
-    # Reasonable number of possessions
-    return by_player[by_player.total_possessions > 100]
+    is_reasonable = np.logical_and(
+        # Reasonable # of games
+        by_player.n_games.to_numpy() > MIN_CAREER_GAMES,
+        # Reasonable number of possessions
+        by_player.total_possessions.to_numpy() > MIN_CAREER_POSSESSIONS,
+    )
+    return by_player[is_reasonable].reset_index(drop=True), player_index, is_reasonable
 
 
 def add_player_aggregates(
     performances: pd.DataFrame,
+    fit_columns_only: bool = False,
 ) -> tuple[pd.DataFrame, pd.DataFrame]:
     """Add columns to the df representing
-    their career averages from all other games"""
-    by_player = _get_player_averages(performances)
-    return (
-        performances.merge(by_player, on="player_id")
-        .assign(
-            value_without_this_game=lambda _: _.total_value - _["value"],
-            possessions_without_this_game=lambda _: _.total_possessions
-            - _.n_possessions,
-        )
-        .assign(
-            other_game_vpp=lambda _: _.value_without_this_game
-            / _.possessions_without_this_game,
-            vpp=lambda _: _["value"] / _.n_possessions,
-        )
-        .assign(vpp_diff=lambda _: _.vpp - _.other_game_vpp)
-    ), by_player
+    their career averages from all other games
 
+    Only rows for players with reasonable sample sizes are kept.
 
+    Parameters
+    ----------
+    performances
+        Data frame of game performances
+    fit_columns_only, optional
+        Only return player_id, n_possessions and vpp_diff
+        (all fit_std_by_sample_size needs) instead of copying every column
+    """
+    by_player, player_index, is_reasonable = _get_player_averages(performances)
+    keep = is_reasonable[player_index]
+    # Row -> position in by_player, which only has the reasonable players
+    reasonable_index = (np.cumsum(is_reasonable) - 1)[player_index[keep]]
+
+    value = performances["value"].to_numpy()[keep]
+    n_possessions = performances.n_possessions.to_numpy()[keep]
+    total_value = by_player.total_value.to_numpy()[reasonable_index]
+    total_possessions = by_player.total_possessions.to_numpy()[reasonable_index]
+    value_without_this_game = total_value - value
+    possessions_without_this_game = total_possessions - n_possessions
+    other_game_vpp = value_without_this_game / possessions_without_this_game
+    vpp = value / n_possessions
+    vpp_diff = vpp - other_game_vpp
+
+    if fit_columns_only:
+        with_aggregates = pd.DataFrame(
+            {
+                "player_id": performances.player_id.to_numpy()[keep],
+                "n_possessions": n_possessions,
+                "vpp_diff": vpp_diff,
+            }
+        )
+        return with_aggregates, by_player
+
+    with_aggregates = performances[keep].reset_index(drop=True)
+    with_aggregates["total_value"] = total_value
+    with_aggregates["n_games"] = by_player.n_games.to_numpy()[reasonable_index]
+    with_aggregates["total_possessions"] = total_possessions
+    with_aggregates["value_without_this_game"] = value_without_this_game
+    with_aggregates["possessions_without_this_game"] = possessions_without_this_game
+    with_aggregates["other_game_vpp"] = other_game_vpp
+    with_aggregates["vpp"] = vpp
+    with_aggregates["vpp_diff"] = vpp_diff
+    return with_aggregates, by_player
 
 
 def fit_std_by_sample_size(
@@ -77,21 +122,51 @@ def fit_std_by_sample_size(
         power of the linear model (ex: 2 makes it fit y = a + b * x + c * x2)
     """
 
+    n_bins = 100
+    percentile = assign_percentile_bins(performances.n_possessions.to_numpy(), n_bins)
+    vpp_diff = performances.vpp_diff.to_numpy()
+    has_diff = ~np.isnan(vpp_diff)
+    binned = BinnedStats.from_values(percentile[has_diff], vpp_diff[has_diff], n_bins)
+    std_by_sample_size = build_std_by_sample_size(
+        binned,
+        binned_median(percentile, performances.n_possessions.to_numpy(), n_bins),
+        inv_power,
+    )
+    return std_by_sample_size, fit_sd_curve(
+        std_by_sample_size, inv_power, polynomial_power
+    )
+
+
+def build_std_by_sample_size(
+    binned: BinnedStats, median_possessions: np.ndarray, inv_power: int = 3
+) -> pd.DataFrame:
+    """Table of the sd of vpp_diff in each possessions bin, skipping empty bins"""
+    std_by_sample_size = pd.DataFrame(
+        {
+            "percentile": np.arange(binned.n_bins),
+            "value_std": binned.std,
+            "median_possessions": median_possessions,
+        }
+    ).dropna(subset=["median_possessions"])
+    std_by_sample_size["inv_value_std"] = np.power(
+        std_by_sample_size.value_std, -inv_power
+    )
+    return std_by_sample_size
+
+
+def fit_sd_curve(
+    std_by_sample_size: pd.DataFrame,
+    inv_power: int = 3,
+    polynomial_power: int = 1,
+) -> _VppStdModel:
+    """Fit the sd of VPP as a function of # of possessions
+    from the output of build_std_by_sample_size"""
+
     def _build_features(x):
         return np.column_stack([np.power(x, i) for i in range(polynomial_power + 1)])
 
-    std_by_sample_size = (
-        performances.assign(
-            percentile=lambda _: (
-                np.argsort(_.n_possessions).argsort() / len(_) * 100
-            ).astype(int)
-        )
-        .groupby("percentile")
-        .agg({"vpp_diff": "std", "n_possessions": "median"})
-        .reset_index()
-        .rename(columns={"vpp_diff": "value_std", "n_possessions": "median_possessions"})
-        .assign(inv_value_std=lambda _: np.power(_.value_std, -inv_power))
-    )
+    # Only fitting needs statsmodels, and it's slow to import
+    import statsmodels.api as sm  # pylint: disable=import-outside-toplevel
 
     features = _build_features(std_by_sample_size.median_possessions)
     regression = sm.OLS(std_by_sample_size.inv_value_std, features).fit()
@@ -106,7 +181,7 @@ def fit_std_by_sample_size(
         predicted_inverse = np.matmul(features, regression.params)
         return 1 / np.power(predicted_inverse, 1 / inv_power)
 
-    return std_by_sample_size, get_vpp_sd
+    return get_vpp_sd
 
 
 class LeagueModel(NamedTuple):
@@ -0,0 +1,192 @@
+# mypy: disable-error-code="arg-type"
+# because there's lots of pandas in here
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Self
+import numpy as np
+import pandas as pd
+
+from .binned_stats import BinnedStats, assign_percentile_bins, binned_median
+from .league_model import (
+    MIN_CAREER_GAMES,
+    MIN_CAREER_POSSESSIONS,
+    LeagueModel,
+    add_player_aggregates,
+    build_std_by_sample_size,
+    fit_sd_curve,
+)
+
+
+@dataclass
+class LeagueModelState:
+    """Sufficient statistics for refitting a LeagueModel without the raw performances
+
+    Careers are stored as per-player sums, and the game | career sd curve
+    as per-bin variance accumulators over fixed possessions bins.
+
+    The bins (and the possessions value representing each one) are fixed
+    from the initial fit. Rows added later are compared against the career
+    as of when they're added, and older rows aren't re-compared against
+    careers that have grown since, so it drifts a bit from a full refit.
+    Rerun vpp_model.py every once in a while to reset it.
+    """
+
+    player_ids: np.ndarray
+    total_values: np.ndarray
+    total_possessions: np.ndarray
+    n_games: np.ndarray
+    bin_starts: np.ndarray
+    median_possessions: np.ndarray
+    vpp_diff_stats: BinnedStats
+
+    @classmethod
+    def from_performances(
+        cls: type[Self],
+        performances: pd.DataFrame,
+        n_bins: int = 100,
+        with_player_aggregates: pd.DataFrame | None = None,
+    ) -> Self:
+        """Build the state from the full history, binned like fit_std_by_sample_size
+
+        Parameters
+        ----------
+        performances
+            Every game performance
+        n_bins, optional
+            Number of possessions bins for the sd curve
+        with_player_aggregates, optional
+            add_player_aggregates(performances, fit_columns_only=True)[0],
+            if it's already been computed (ex: to fit the model), so it isn't redone
+        """
+        careers = _get_career_totals(performances)
+        if with_player_aggregates is None:
+            with_player_aggregates, _ = add_player_aggregates(
+                performances, fit_columns_only=True
+            )
+
+        n_possessions = with_player_aggregates.n_possessions.to_numpy()
+        percentile = assign_percentile_bins(n_possessions, n_bins)
+        vpp_diff = with_player_aggregates.vpp_diff.to_numpy()
+        has_diff = ~np.isnan(vpp_diff)
+
+        # Lowest # of possessions in each percentile bucket,
+        # so rows added later can be put in the same buckets
+        sorted_possessions = np.sort(n_possessions)
+        first_ranks = -(-np.arange(n_bins) * len(n_possessions) // n_bins)
+        return cls(
+            player_ids=careers.index.to_numpy(),
+            total_values=careers.total_value.to_numpy(),
+            total_possessions=careers.total_possessions.to_numpy(),
+            n_games=careers.n_games.to_numpy(),
+            bin_starts=sorted_possessions[
+                np.minimum(first_ranks, len(n_possessions) - 1)
+            ],
+            median_possessions=binned_median(percentile, n_possessions, n_bins),
+            vpp_diff_stats=BinnedStats.from_values(
+                percentile[has_diff], vpp_diff[has_diff], n_bins
+            ),
+        )
+
+    @property
+    def careers(self) -> pd.DataFrame:
+        return pd.DataFrame(
+            {
+                "total_value": self.total_values,
+                "total_possessions": self.total_possessions,
+                "n_games": self.n_games,
+            },
+            index=pd.Index(self.player_ids, name="player_id"),
+        )
+
+    def add_performances(self, performances: pd.DataFrame) -> "LeagueModelState":
+        """Merge in performances (ex: a new season) that aren't in the state yet"""
+        careers = self.careers.add(_get_career_totals(performances), fill_value=0)
+        careers["n_games"] = careers.n_games.astype(np.int64)
+
+        career = careers.loc[performances.player_id]
+        qualified = np.logical_and(
+            (career.n_games > MIN_CAREER_GAMES).to_numpy(),
+            (career.total_possessions > MIN_CAREER_POSSESSIONS).to_numpy(),
+        )
+        value = performances["value"].to_numpy()
+        n_possessions = performances.n_possessions.to_numpy()
+        other_game_vpp = (career.total_value.to_numpy() - value) / (
+            career.total_possessions.to_numpy() - n_possessions
+        )
+        vpp_diff = value / n_possessions - other_game_vpp
+        to_add = np.logical_and(qualified, ~np.isnan(vpp_diff))
+
+        bin_ids = np.searchsorted(self.bin_starts, n_possessions, side="right") - 1
+        bin_ids = np.maximum(bin_ids, 0)
+        return LeagueModelState(
+            player_ids=careers.index.to_numpy(),
+            total_values=careers.total_value.to_numpy(),
+            total_possessions=careers.total_possessions.to_numpy(),
+            n_games=careers.n_games.to_numpy(),
+            bin_starts=self.bin_starts,
+            median_possessions=self.median_possessions,
+            vpp_diff_stats=self.vpp_diff_stats.update(
+                bin_ids[to_add], vpp_diff[to_add]
+            ),
+        )
+
+    def fit(self, inv_power: int = 3, polynomial_power: int = 1) -> LeagueModel:
+        """Fit the league model from the stored stats"""
+        qualified = np.logical_and(
+            self.n_games > MIN_CAREER_GAMES,
+            self.total_possessions > MIN_CAREER_POSSESSIONS,
+        )
+        career_vpp = self.total_values[qualified] / self.total_possessions[qualified]
+        std_by_sample_size = build_std_by_sample_size(
+            self.vpp_diff_stats, self.median_possessions, inv_power
+        )
+        return LeagueModel(
+            possessions_to_vpp_std=fit_sd_curve(
+                std_by_sample_size, inv_power, polynomial_power
+            ),
+            vpp_mean=career_vpp.mean(),
+            vpp_variance=career_vpp.var(ddof=1),
+        )
+
+    def save(self, filename: str):
+        """Store the state as a .npz file"""
+        Path(filename).parent.mkdir(exist_ok=True, parents=True)
+        with open(filename, "wb") as file:
+            np.savez(
+                file,
+                player_ids=self.player_ids,
+                total_values=self.total_values,
+                total_possessions=self.total_possessions,
+                n_games=self.n_games,
+                bin_starts=self.bin_starts,
+                median_possessions=self.median_possessions,
+                bin_counts=self.vpp_diff_stats.counts,
+                bin_means=self.vpp_diff_stats.means,
+                bin_m2s=self.vpp_diff_stats.m2s,
+            )
+
+    @classmethod
+    def load(cls: type[Self], filename: str) -> Self:
+        """Read the state from a .npz file"""
+        with np.load(filename, allow_pickle=False) as saved:
+            return cls(
+                player_ids=saved["player_ids"],
+                total_values=saved["total_values"],
+                total_possessions=saved["total_possessions"],
+                n_games=saved["n_games"],
+                bin_starts=saved["bin_starts"],
+                median_possessions=saved["median_possessions"],
+                vpp_diff_stats=BinnedStats(
+                    counts=saved["bin_counts"],
+                    means=saved["bin_means"],
+                    m2s=saved["bin_m2s"],
+                ),
+            )
+
+
+def _get_career_totals(performances: pd.DataFrame) -> pd.DataFrame:
+    return performances.groupby("player_id").agg(
+        total_value=("value", "sum"),
+        total_possessions=("n_possessions", "sum"),
+        n_games=("n_possessions", "count"),
+    )
@@ -1,12 +1,15 @@
 # mypy: disable-error-code="arg-type"
 # because there's lots of pandas in here
+import numpy as np
 import pandas as pd
 from tqdm import tqdm
 
+from .batch_ratings import get_game_order
 from .league_model import LeagueModel
-from .callbacks import TeamCallback, PlayerCallback
-from .priors import PriorGetter, get_simple_prior, Player
+from .callbacks import TeamCallback, PlayerCallback, build_team_game_context
+from .priors import PriorGetter, get_simple_prior
 from .ratings import PlayerRatings
+from .team_strength import TeamStrengthCache
 
 
 def update_loop(
@@ -15,40 +18,76 @@ def update_loop(
     prior_getter: PriorGetter | None = None,
     team_callbacks: list[TeamCallback] | None = None,
     player_callbacks: list[PlayerCallback] | None = None,
+    team_strengths: TeamStrengthCache | None = None,
 ) -> pd.DataFrame:
     """Assuming the performances DF is sorted in time,
-    run the player rating update logic"""
+    run the player rating update logic
+
+    If team_strengths is given, the two teams in each game
+    are updated in it after the game's ratings are."""
     if prior_getter is None:
         prior_getter = get_simple_prior(model)
 
     player_ratings = PlayerRatings(prior_getter)
+    first_games = performances.iloc[get_game_order(performances)].drop_duplicates(
+        "player_id"
+    )
+    player_ratings.resolve_priors(
+        first_games.player_id.to_numpy(), first_games.team_id.to_numpy()
+    )
     team_callbacks = team_callbacks or []
     player_callbacks = player_callbacks or []
 
-    for _, game in tqdm(performances.groupby("game_id")):
+    # The updates read these by row position instead of from each row
+    performances = performances.reset_index(drop=True)
+    game_vpps = (performances["value"] / performances.n_possessions).to_numpy(
+        dtype=float
+    )
+    # Callbacks get their team's rows of these (ex: defense_sd) in the context
+    sd_columns = {
+        column: performances[column].to_numpy(dtype=float)
+        for column in performances.columns
+        if column.endswith("_sd")
+    }
+    vpp_vars = np.square(sd_columns["vpp_sd"])
+
+    for game_id, game in tqdm(performances.groupby("game_id")):
+        rosters = {}
         for team_id, team in game.groupby("team_id"):
+            context = build_team_game_context(team_id, team, player_ratings, sd_columns)
             for team_callback in team_callbacks:
-                team_callback(team_id, player_ratings, team)
-            for player_performance in team.itertuples():
-                for player_callback in player_callbacks:
-                    player_callback(team_id, player_performance)
-                player = Player(
-                    player_performance.player_id, player_performance.team_id
-                )
-                current_rating = player_ratings.get_rating(player)
-                new_rating = _update_rating(*current_rating, player_performance)
-                player_ratings.update_rating(player_performance.player_id, new_rating)
+                team_callback(context)
+            if player_callbacks:
+                for player_performance in team.itertuples():
+                    for player_callback in player_callbacks:
+                        player_callback(team_id, player_performance)
+            rows = team.index.to_numpy()
+            new_mus, new_vars = _update_ratings(
+                context.pregame_vpp,
+                context.pregame_vpp_var,
+                game_vpps[rows],
+                vpp_vars[rows],
+            )
+            for player_id, new_mu, new_var in zip(
+                context.player_ids.tolist(), new_mus.tolist(), new_vars.tolist()
+            ):
+                player_ratings.update_rating(player_id, (new_mu, new_var))
+            rosters[team_id] = context.player_ids
+        if team_strengths is not None:
+            team_strengths.update_game(game_id, rosters, player_ratings)
 
     return player_ratings.to_data_frame()
 
 
-def _update_rating(
-    player_mu: float, player_var: float, player_performance
-) -> tuple[float, float]:
-    # Rating Update
-    game_vpp = player_performance.value / player_performance.n_possessions
-    new_mu = (player_mu * (player_performance.vpp_sd**2) + game_vpp * player_var) / (
-        (player_performance.vpp_sd**2) + player_var
+def _update_ratings(
+    player_mus: np.ndarray,
+    player_vars: np.ndarray,
+    game_vpps: np.ndarray,
+    vpp_vars: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+    # Rating Update, for a team's players at once
+    new_mus = (player_mus * vpp_vars + game_vpps * player_vars) / (
+        vpp_vars + player_vars
     )
-    new_var = 1 / ((1 / player_var + 1 / (player_performance.vpp_sd**2)))
-    return new_mu, new_var
+    new_vars = 1 / (1 / player_vars + 1 / vpp_vars)
+    return new_mus, new_vars
@@ -0,0 +1,104 @@
+# mypy: disable-error-code="arg-type"
+# because there's lots of pandas in here
+"""The fits from the defense, adjusted and team prior notebooks, as functions
+(the notebooks are still the place to look at the plots)"""
+import pandas as pd
+
+from .callbacks import DefenseAdjustingCallback, DefenseCallback
+from .league_model import LeagueModel, add_player_aggregates, fit_std_by_sample_size
+from .loop import update_loop
+from .priors import PriorGetter, TeamPriorState
+
+
+def fit_defense_model(
+    performances: pd.DataFrame,
+    model: LeagueModel,
+    prior_getter: PriorGetter | None = None,
+    polynomial_power: int = 3,
+) -> LeagueModel:
+    """defensive_vpp_model.ipynb (or _prior.ipynb, given the team prior getter)"""
+    performances = _sorted_with_sds(performances, model)
+    defense_callback = DefenseCallback()
+    update_loop(
+        performances,
+        model,
+        prior_getter=prior_getter,
+        team_callbacks=[defense_callback.team_callback],
+    )
+    defensive_performances = defense_callback.defensive_performances
+    defense_callback.close()
+    return fit_model_from_values(
+        defensive_performances, polynomial_power=polynomial_power
+    )
+
+
+def fit_adjusted_model(
+    performances: pd.DataFrame,
+    model: LeagueModel,
+    defense_model: LeagueModel,
+    prior_getter: PriorGetter | None = None,
+    polynomial_power: int = 5,
+) -> LeagueModel:
+    """adjusted_model.ipynb (or _prior.ipynb, given the team prior getter,
+    which used polynomial_power=3)"""
+    performances = _sorted_with_sds(performances, model).assign(
+        defense_sd=lambda _: defense_model.possessions_to_vpp_std(_.n_possessions)
+    )
+    defense_callback = DefenseAdjustingCallback(defense_model)
+    update_loop(performances, model, prior_getter, [defense_callback.team_callback])
+    adjusted_performances = defense_callback.adjusted_performances
+    defense_callback.close()
+    return fit_model_from_values(
+        adjusted_performances, polynomial_power=polynomial_power
+    )
+
+
+def fit_model_from_values(
+    performances: pd.DataFrame, inv_power: int = 1, polynomial_power: int = 3
+) -> LeagueModel:
+    """Fit a model's sd curve and prior from rows with
+    player_id, n_possessions and value columns"""
+    with_player_aggregates, by_player = add_player_aggregates(
+        performances, fit_columns_only=True
+    )
+    _, get_vpp_sd = fit_std_by_sample_size(
+        with_player_aggregates, inv_power=inv_power, polynomial_power=polynomial_power
+    )
+    career_vpp = by_player.total_value / by_player.total_possessions
+    return LeagueModel(
+        possessions_to_vpp_std=get_vpp_sd,
+        vpp_mean=career_vpp.mean(),
+        vpp_variance=career_vpp.var(),
+    )
+
+
+def build_team_priors(
+    player_ratings: pd.DataFrame,
+    player_info: pd.DataFrame,
+    performances: pd.DataFrame,
+) -> pd.DataFrame:
+    """team_priors.ipynb: each team's VPP prior from all of their past players
+    (see TeamPriorState to add seasons without redoing the whole history)
+
+    Parameters
+    ----------
+    player_ratings
+        Indexed by player_id, with a vpp column (ex: data/{league}_player_ratings.csv)
+    player_info
+        Indexed by player_id, with a team_id column (ex: data/{league}_player_info.csv)
+    performances
+        Every performance, for each player's total possessions
+
+    Returns
+    -------
+    Indexed by team_id, with vpp and vpp_var columns
+    """
+    return TeamPriorState.from_performances(performances).build(
+        player_ratings, player_info
+    )
+
+
+def _sorted_with_sds(performances: pd.DataFrame, model: LeagueModel) -> pd.DataFrame:
+    return performances.assign(
+        vpp_sd=model.possessions_to_vpp_std(performances.n_possessions)
+    ).sort_values("game_id")
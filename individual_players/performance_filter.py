@@ -7,22 +7,38 @@ import numpy as np
 _DATA_DIR = Path(__file__).parent.parent / "data"
 
 
-def build_combined_df(gender: str, verbose: bool = True) -> pd.DataFrame:
-    player_performances = _load_all_seasons(gender)
+def build_combined_df(
+    gender: str, verbose: bool = True, seasons: list[int] | None = None
+) -> pd.DataFrame:
+    player_performances = _load_all_seasons(gender, seasons)
     player_performances = _drop_bad_rows(player_performances, verbose)
     player_performances = _drop_bad_players(player_performances, verbose)
     return _add_opponent(player_performances)
 
 
-def _load_all_seasons(gender: str):
-    files = _DATA_DIR.glob(f"all_performances_{gender}_*.csv")
-    return pd.concat(pd.read_csv(f) for f in files)
+def _load_all_seasons(gender: str, seasons: list[int] | None = None):
+    if seasons is None:
+        files = _DATA_DIR.glob(f"all_performances_{gender}_*.csv")
+    else:
+        files = (
+            _DATA_DIR / f"all_performances_{gender}_{year}.csv" for year in seasons
+        )
+    return pd.concat(pd.read_csv(f).assign(season=_get_season(f)) for f in files)
+
+
+def _get_season(csv_path: Path) -> int:
+    """all_performances_{gender}_{year}.csv -> year"""
+    return int(csv_path.stem.rsplit("_", 1)[-1])
 
 
 def _drop_bad_rows(player_performances: pd.DataFrame, verbose: bool) -> pd.DataFrame:
     """Drop any rows that are exactly duplicated or have <=0 possessions"""
     before = len(player_performances)
-    player_performances = player_performances.drop_duplicates()
+    # season comes from the file name, so a row that's in two seasons' files
+    # is still a duplicate (the first file's copy is kept)
+    player_performances = player_performances.drop_duplicates(
+        subset=player_performances.columns.drop("season", errors="ignore")
+    )
     after = len(player_performances)
 
     if before > after and verbose:
@@ -0,0 +1,186 @@
+"""Run the stages of the runbook in dependency order,
+skipping the ones whose inputs haven't changed since they last ran"""
+import hashlib
+import json
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from fnmatch import fnmatch
+from glob import glob
+from pathlib import Path
+from typing import Callable, NamedTuple
+
+
+class Stage(NamedTuple):
+    """One step of the pipeline
+
+    run needs to be picklable (ex: a module-level function or a partial of one),
+    since it's called in a worker process.
+    inputs can be globs. A stage depends on every stage with an output
+    matching one of its inputs.
+    """
+
+    name: str
+    run: Callable[[], None]
+    inputs: list[str]
+    outputs: list[str]
+    # Rerun even if the inputs are the same (ex: downloads)
+    always_run: bool = False
+
+
+def run_pipeline(
+    stages: list[Stage],
+    state_path: str | Path = "models/pipeline_state.json",
+    n_workers: int | None = None,
+    force: bool = False,
+) -> list[str]:
+    """Run every stage that's out of date, running independent ones concurrently
+
+    A stage is up to date if all of its outputs exist and the hash of its inputs
+    (their paths and contents) matches what it was the last time it succeeded.
+    Hashes are saved to state_path after each stage finishes.
+    If a stage fails, the stages that depend on it are skipped and
+    the error's raised once everything else is done.
+
+    Returns the names of the stages that ran.
+    """
+    dependencies = _get_dependencies(stages)
+    by_name = {stage.name: stage for stage in stages}
+    state_path = Path(state_path)
+    state = _load_state(state_path)
+    file_hashes: dict[str, str] = {}
+
+    done: set[str] = set()
+    ran: list[str] = []
+    failed: dict[str, BaseException] = {}
+    running: dict[Future, tuple[str, str]] = {}
+    waiting = [stage.name for stage in stages]
+
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        while waiting or running:
+            blocked = _get_downstream(set(failed), dependencies) | set(failed)
+            for name in list(waiting):
+                if dependencies[name] & blocked:
+                    waiting.remove(name)
+                    continue
+                if not dependencies[name] <= done:
+                    continue
+                waiting.remove(name)
+                stage = by_name[name]
+                input_hash = _hash_inputs(stage, file_hashes)
+                if not (force or stage.always_run) and _is_up_to_date(
+                    stage, state.get(name), input_hash
+                ):
+                    done.add(name)
+                    continue
+                print(f"Running {name}")
+                running[executor.submit(stage.run)] = (name, input_hash)
+
+            if not running:
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name, input_hash = running.pop(future)
+                if (error := future.exception()) is not None:
+                    print(f"{name} failed: {error!r}")
+                    failed[name] = error
+                    continue
+                # Outputs changed, so anything hashed from them is stale
+                for output in by_name[name].outputs:
+                    for path in glob(output):
+                        file_hashes.pop(path, None)
+                state[name] = input_hash
+                _save_state(state_path, state)
+                done.add(name)
+                ran.append(name)
+
+    if failed:
+        skipped = sorted(set(by_name) - done - set(failed))
+        raise RuntimeError(
+            f"Stages failed: {sorted(failed)}. Skipped because of them: {skipped}"
+        ) from next(iter(failed.values()))
+    return ran
+
+
+def _get_dependencies(stages: list[Stage]) -> dict[str, set[str]]:
+    names = [stage.name for stage in stages]
+    if len(set(names)) != len(names):
+        raise ValueError("Stage names need to be unique")
+    dependencies = {
+        stage.name: {
+            other.name
+            for other in stages
+            if other is not stage
+            and any(
+                fnmatch(output, pattern)
+                for pattern in stage.inputs
+                for output in other.outputs
+            )
+        }
+        for stage in stages
+    }
+    _check_for_cycles(dependencies)
+    return dependencies
+
+
+def _check_for_cycles(dependencies: dict[str, set[str]]) -> None:
+    remaining = {name: set(deps) for name, deps in dependencies.items()}
+    while remaining:
+        ready = [name for name, deps in remaining.items() if not deps]
+        if not ready:
+            raise ValueError(f"Stages depend on each other: {sorted(remaining)}")
+        for name in ready:
+            del remaining[name]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+
+
+def _get_downstream(names: set[str], dependencies: dict[str, set[str]]) -> set[str]:
+    """Every stage that depends on one of names, directly or not"""
+    downstream: set[str] = set()
+    frontier = names
+    while frontier:
+        frontier = {
+            name
+            for name, deps in dependencies.items()
+            if deps & frontier and name not in downstream
+        }
+        downstream |= frontier
+    return downstream
+
+
+def _hash_inputs(stage: Stage, file_hashes: dict[str, str]) -> str:
+    digest = hashlib.sha256()
+    for pattern in stage.inputs:
+        digest.update(pattern.encode())
+        for path in sorted(glob(pattern)):
+            if path not in file_hashes:
+                file_hashes[path] = _hash_file(path)
+            digest.update(path.encode())
+            digest.update(file_hashes[path].encode())
+    return digest.hexdigest()
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        while chunk := file.read(2**20):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _is_up_to_date(stage: Stage, last_hash: str | None, input_hash: str) -> bool:
+    return last_hash == input_hash and all(glob(output) for output in stage.outputs)
+
+
+def _load_state(state_path: Path) -> dict[str, str]:
+    if not state_path.exists():
+        return {}
+    with open(state_path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def _save_state(state_path: Path, state: dict[str, str]) -> None:
+    state_path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = state_path.with_suffix(".tmp")
+    with open(temp_path, "w", encoding="utf-8") as file:
+        json.dump(state, file, indent=2, sort_keys=True)
+    temp_path.replace(state_path)
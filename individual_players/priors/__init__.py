@@ -1,3 +1,4 @@
 from .simple import get_simple_prior
-from .types import Player, PriorGetter, Prior
-from .team_history import build_prior_getter
+from .types import BatchPriorGetter, Player, PriorGetter, Prior
+from .batch import get_batch_prior_getter
+from .team_history import TeamPriorGetter, TeamPriorState, build_prior_getter
@@ -0,0 +1,25 @@
+import numpy as np
+
+from .types import BatchPriorGetter, Player, PriorGetter
+
+
+def get_batch_prior_getter(prior_getter: PriorGetter) -> BatchPriorGetter:
+    """prior_getter's batch method if it has one,
+    otherwise a loop calling it for each player"""
+    batch = getattr(prior_getter, "batch", None)
+    if batch is not None:
+        return batch
+
+    def _get_priors(
+        player_ids: np.ndarray, team_ids: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        priors = [
+            prior_getter(Player(player_id, team_id))
+            for player_id, team_id in zip(player_ids, team_ids)
+        ]
+        return (
+            np.array([p.value for p in priors], dtype=float),
+            np.array([p.variance for p in priors], dtype=float),
+        )
+
+    return _get_priors
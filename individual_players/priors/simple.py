@@ -1,7 +1,25 @@
+import numpy as np
+
 from ..league_model import LeagueModel
-from .types import PriorGetter, Prior
+from .types import PriorGetter, Player, Prior
+
+
+class _SimplePrior:
+    def __init__(self, prior: Prior) -> None:
+        self._prior = prior
+
+    def __call__(self, _: Player) -> Prior:
+        return self._prior
+
+    def batch(
+        self, player_ids: np.ndarray, _: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        return (
+            np.full(len(player_ids), self._prior.value, dtype=float),
+            np.full(len(player_ids), self._prior.variance, dtype=float),
+        )
 
 
 def get_simple_prior(model: LeagueModel) -> PriorGetter:
     """Simple prior, just the same for everybody"""
-    return lambda _: Prior(model.vpp_mean, model.vpp_variance)
+    return _SimplePrior(Prior(model.vpp_mean, model.vpp_variance))
@@ -1,22 +1,187 @@
 # mypy: disable-error-code="arg-type"
 # because there's lots of pandas in here
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Self
+import numpy as np
 import pandas as pd
 
 from .types import PriorGetter, Prior, Player
 
 
+class TeamPriorGetter:
+    """Prior based on your team
+
+    Parameters
+    ----------
+    team_priors
+        Indexed by team_id, with vpp and vpp_var columns (ex: from TeamPriorState.build).
+        Teams that aren't in there get the median vpp and the biggest vpp_var.
+    """
+
+    def __init__(self, team_priors: pd.DataFrame) -> None:
+        self._team_ids = pd.Index(team_priors.index)
+        self._values = team_priors.vpp.to_numpy(dtype=float)
+        self._variances = team_priors.vpp_var.to_numpy(dtype=float)
+        self._by_team = dict(
+            zip(self._team_ids, map(Prior, self._values, self._variances))
+        )
+        self.default_prior = Prior(team_priors.vpp.median(), team_priors.vpp_var.max())
+
+    def __call__(self, player: Player) -> Prior:
+        return self._by_team.get(player.team_id, self.default_prior)
+
+    def batch(
+        self, _: np.ndarray, team_ids: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        positions = self._team_ids.get_indexer(team_ids)
+        is_known = positions >= 0
+        # Only indexed where they're known, since there may not be any priors at all
+        values = np.full(len(positions), self.default_prior.value, dtype=float)
+        variances = np.full(len(positions), self.default_prior.variance, dtype=float)
+        values[is_known] = self._values[positions[is_known]]
+        variances[is_known] = self._variances[positions[is_known]]
+        return values, variances
+
+
 def build_prior_getter(league: str) -> PriorGetter:
-    """Prior based on your team"""
-    team_priors = pd.read_csv(f"./data/{league}_team_priors.csv", index_col=0)
+    """Prior based on your team, from data/{league}_team_priors.csv"""
+    return TeamPriorGetter(pd.read_csv(f"./data/{league}_team_priors.csv", index_col=0))
+
+
+@dataclass
+class TeamPriorState:
+    """Each player's total possessions, which is all that team priors need
+    from the performances, so seasons can be added without rereading old ones
+    (the ratings and player info are small, so they're passed in to build)"""
+
+    player_ids: np.ndarray
+    total_possessions: np.ndarray
+
+    @classmethod
+    def from_performances(cls: type[Self], performances: pd.DataFrame) -> Self:
+        possessions = performances.groupby("player_id").n_possessions.sum()
+        return cls(
+            player_ids=possessions.index.to_numpy(),
+            total_possessions=possessions.to_numpy(dtype=float),
+        )
+
+    @property
+    def possessions(self) -> pd.Series:
+        return pd.Series(
+            self.total_possessions,
+            index=pd.Index(self.player_ids, name="player_id"),
+            name="n_possessions",
+        )
+
+    def add_performances(self, performances: pd.DataFrame) -> "TeamPriorState":
+        """Merge in performances (ex: a new season) that aren't in the state yet"""
+        possessions = self.possessions.add(
+            performances.groupby("player_id").n_possessions.sum(), fill_value=0
+        )
+        return TeamPriorState(
+            player_ids=possessions.index.to_numpy(),
+            total_possessions=possessions.to_numpy(dtype=float),
+        )
+
+    def build(
+        self,
+        player_ratings: pd.DataFrame,
+        player_info: pd.DataFrame,
+        weight_by_possessions: bool = False,
+    ) -> pd.DataFrame:
+        """Each team's VPP prior from all of their past players (team_priors.ipynb)
+
+        Starting from the average team, each player's rating is a normal
+        update to their team's prior, with one variance for every player
+        (how far players are from their teammates, which is pretty flat by
+        sample size). That's the same as one precision-weighted average per team.
+
+        Parameters
+        ----------
+        player_ratings
+            Indexed by player_id, with a vpp column (ex: data/{league}_player_ratings.csv)
+        player_info
+            Indexed by player_id, with a team_id column (ex: data/{league}_player_info.csv)
+        weight_by_possessions, optional
+            Count each player in proportion to their possessions
+            (relative to the average player) instead of equally.
+            Off by default because that's how the notebook did it, and the
+            _team_prior defense/adjusted models were fit with those priors,
+            so turning it on means refitting them too.
+
+        Returns
+        -------
+        Indexed by team_id, with vpp and vpp_var columns
+        """
+        players = (
+            player_ratings[["vpp"]]
+            .merge(
+                player_info[["team_id"]], left_index=True, right_index=True, how="left"
+            )
+            .merge(self.possessions, left_index=True, right_index=True)
+            .assign(total_value=lambda _: _.vpp * _.n_possessions)
+        )
+        teams = (
+            players.groupby("team_id")
+            .agg({"total_value": "sum", "n_possessions": "sum"})
+            .assign(vpp=lambda _: _.total_value / _.n_possessions)
+        )
+        players = players.merge(
+            teams, left_on="team_id", right_index=True, suffixes=("", "_team")
+        ).assign(
+            other_players_vpp=lambda _: (_.total_value_team - _.total_value)
+            / (_.n_possessions_team - _.n_possessions),
+            vpp_diff=lambda _: _.vpp - _.other_players_vpp,
+        )
+
+        std_by_sample_size = (
+            players.assign(
+                percentile=lambda _: (
+                    np.argsort(_.n_possessions).argsort() / len(_) * 100
+                ).astype(int),
+            )
+            .groupby("percentile")
+            .agg({"vpp_diff": "std"})
+        )
+        # It's pretty flat by sample size, so one variance for everybody
+        vpp_var = std_by_sample_size.vpp_diff.median() ** 2
 
-    default_prior = Prior(team_priors.vpp.median(), team_priors.vpp_var.max())
+        weights = (
+            players.n_possessions / players.n_possessions.mean()
+            if weight_by_possessions
+            else pd.Series(1.0, index=players.index)
+        )
+        by_team = (
+            players.assign(weight=weights, weighted_vpp=weights * players.vpp)
+            .groupby("team_id", sort=False)
+            .agg({"weight": "sum", "weighted_vpp": "sum"})
+        )
+        start_vpp, start_var = teams.vpp.mean(), teams.vpp.var()
+        precision = 1 / start_var + by_team.weight / vpp_var
+        return pd.DataFrame(
+            {
+                "vpp": (start_vpp / start_var + by_team.weighted_vpp / vpp_var)
+                / precision,
+                "vpp_var": 1 / precision,
+            }
+        ).rename_axis(None)
 
-    def _get_prior(player: Player) -> Prior:
-        # TODO: default if the team's not in there yet
-        try:
-            team_prior = team_priors.loc[player.team_id]
-        except KeyError:
-            return default_prior
-        return Prior(team_prior.vpp, team_prior.vpp_var)
+    def save(self, filename: str):
+        """Store the state as a .npz file"""
+        Path(filename).parent.mkdir(exist_ok=True, parents=True)
+        with open(filename, "wb") as file:
+            np.savez(
+                file,
+                player_ids=self.player_ids,
+                total_possessions=self.total_possessions,
+            )
 
-    return _get_prior
+    @classmethod
+    def load(cls: type[Self], filename: str) -> Self:
+        """Read the state from a .npz file"""
+        with np.load(filename, allow_pickle=False) as saved:
+            return cls(
+                player_ids=saved["player_ids"],
+                total_possessions=saved["total_possessions"],
+            )
@@ -1,4 +1,5 @@
 from typing import Callable, NamedTuple
+import numpy as np
 
 
 class Player(NamedTuple):
@@ -12,3 +13,8 @@ class Prior(NamedTuple):
 
 
 PriorGetter = Callable[[Player], Prior]
+
+# Priors for many players at once: (player_ids, team_ids) -> (values, variances),
+# lined up with player_ids. Prior getters can provide one as a batch method
+# (see get_batch_prior_getter).
+BatchPriorGetter = Callable[[np.ndarray, np.ndarray], tuple[np.ndarray, np.ndarray]]
@@ -1,6 +1,7 @@
+import numpy as np
 import pandas as pd
 
-from .priors import Player, PriorGetter
+from .priors import Player, Prior, PriorGetter, get_batch_prior_getter
 
 
 _Rating = tuple[float, float]
@@ -10,11 +11,25 @@ class PlayerRatings:
     def __init__(self, prior_getter: PriorGetter) -> None:
         self._ratings: dict[str, _Rating] = {}
         self._prior_getter = prior_getter
+        self._priors: dict[str, Prior] = {}
+
+    def resolve_priors(self, player_ids: np.ndarray, team_ids: np.ndarray) -> None:
+        """Get the priors for these players (with the team from their first game)
+        all at once, instead of one at a time as they show up"""
+        values, variances = get_batch_prior_getter(self._prior_getter)(
+            player_ids, team_ids
+        )
+        self._priors.update(
+            zip(player_ids.tolist(), map(Prior, values.tolist(), variances.tolist()))
+        )
 
     def get_rating(self, player: Player) -> _Rating:
         rating = self._ratings.get(player.player_id)
         if rating is not None:
             return rating
+        prior = self._priors.get(player.player_id)
+        if prior is not None:
+            return prior
         return self._prior_getter(player)
 
     def update_rating(self, player_id: str, new_rating: _Rating) -> None:
@@ -0,0 +1,242 @@
+# mypy: disable-error-code="arg-type"
+# because there's lots of pandas in here
+"""Answer rating questions (one player, a team's roster, top N)
+from arrays that are indexed and sorted once, instead of rereading CSVs"""
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Literal, NamedTuple
+from urllib.parse import parse_qs, urlparse
+import numpy as np
+import pandas as pd
+
+from .snapshot import RatingsSnapshotFile
+
+
+_DATA_DIR = Path(__file__).parent.parent / "data"
+
+_SortBy = Literal["vpp", "defense_vpp"]
+# Lower defense is better (it's how much VPP a player allows)
+_DESCENDING = {"vpp": True, "defense_vpp": False}
+
+
+class RatingsSnapshot(NamedTuple):
+    """One league's ratings, lined up by player"""
+
+    player_ids: np.ndarray
+    # "?" if the player's team isn't known
+    team_ids: np.ndarray
+    vpp: np.ndarray
+    vpp_var: np.ndarray
+    defense_vpp: np.ndarray
+    defense_var: np.ndarray
+
+    @classmethod
+    def load(
+        cls, league: str, prior: str = "", data_dir: Path = _DATA_DIR
+    ) -> "RatingsSnapshot":
+        """From current_teams.py's binary snapshot if it's there, otherwise its CSVs"""
+        snapshot_path = data_dir / f"{league}_player_ratings{prior}.snapshot"
+        if snapshot_path.exists():
+            return cls.from_snapshot_file(league, snapshot_path, data_dir)
+        return cls.from_csvs(league, prior, data_dir)
+
+    @classmethod
+    def from_snapshot_file(
+        cls, league: str, path: Path, data_dir: Path = _DATA_DIR
+    ) -> "RatingsSnapshot":
+        """Adjusted offense and defense from a binary snapshot
+        (the same ratings current_teams.py writes to the CSVs)"""
+        snapshot = RatingsSnapshotFile(path)
+        player_ids = np.asarray(snapshot.to_data_frame("defense").index)
+        return cls(
+            player_ids,
+            _get_teams(league, player_ids, data_dir),
+            *map(np.array, snapshot["adjusted_offense"]),
+            *map(np.array, snapshot["defense"]),
+        )
+
+    @classmethod
+    def from_csvs(
+        cls, league: str, prior: str = "", data_dir: Path = _DATA_DIR
+    ) -> "RatingsSnapshot":
+        """From current_teams.py's ratings CSVs"""
+        offense = pd.read_csv(
+            data_dir / f"{league}_player_ratings{prior}.csv", index_col=0
+        )
+        defense = pd.read_csv(
+            data_dir / f"{league}_player_ratings_defense{prior}.csv", index_col=0
+        ).reindex(offense.index)
+        player_ids = offense.index.to_numpy()
+        return cls(
+            player_ids=player_ids,
+            team_ids=_get_teams(league, player_ids, data_dir),
+            vpp=offense.vpp.to_numpy(dtype=float),
+            vpp_var=offense.vpp_var.to_numpy(dtype=float),
+            defense_vpp=defense.vpp.to_numpy(dtype=float),
+            defense_var=defense.vpp_var.to_numpy(dtype=float),
+        )
+
+
+def _get_teams(league: str, player_ids: np.ndarray, data_dir: Path) -> np.ndarray:
+    """Each player's team from names.py's player info, "?" if it's not known"""
+    info_path = data_dir / f"{league}_player_info.csv"
+    if not info_path.exists():
+        return np.full(len(player_ids), "?", dtype=object)
+    info = pd.read_csv(info_path).drop_duplicates("player_id", keep="last")
+    teams = info.set_index("player_id").team_id.astype(str).reindex(player_ids)
+    return teams.fillna("?").to_numpy()
+
+
+class _RatingsIndex:
+    """A snapshot plus everything needed to answer queries without scanning it"""
+
+    def __init__(self, snapshot: RatingsSnapshot) -> None:
+        self.snapshot = snapshot
+        # Plain python values, so rows can go straight to JSON
+        self.player_ids = snapshot.player_ids.tolist()
+        self.positions = {str(pid): i for i, pid in enumerate(snapshot.player_ids)}
+        self.orders = {
+            by: _sort_positions(getattr(snapshot, by), descending)
+            for by, descending in _DESCENDING.items()
+        }
+        team_index, team_ids = pd.factorize(snapshot.team_ids)
+        by_team = np.lexsort((-snapshot.vpp, team_index))
+        team_counts = np.bincount(team_index, minlength=len(team_ids))
+        self.teams = dict(zip(team_ids, np.split(by_team, np.cumsum(team_counts)[:-1])))
+
+    def row(self, position: int) -> dict:
+        snapshot = self.snapshot
+        return {
+            "player_id": self.player_ids[position],
+            "team_id": snapshot.team_ids[position],
+            "vpp": _to_json_number(snapshot.vpp[position]),
+            "vpp_var": _to_json_number(snapshot.vpp_var[position]),
+            "defense_vpp": _to_json_number(snapshot.defense_vpp[position]),
+            "defense_var": _to_json_number(snapshot.defense_var[position]),
+        }
+
+
+def _to_json_number(value: np.floating) -> float | None:
+    """None (null) for missing ratings (ex: a player without a defense rating),
+    since NaN isn't valid JSON"""
+    return value.item() if np.isfinite(value) else None
+
+
+class RatingsService:
+    """Point, team and top-N queries over each league's ratings
+
+    Everything is indexed when a snapshot is loaded.
+    reload builds the new index off to the side and then swaps it in
+    with one assignment, so queries running during a reload
+    see either the old ratings or the new ones, never a mix.
+    """
+
+    def __init__(self, snapshots: dict[str, RatingsSnapshot]) -> None:
+        self._indexes = {
+            league: _RatingsIndex(snapshot) for league, snapshot in snapshots.items()
+        }
+
+    @classmethod
+    def load(
+        cls, leagues: list[str], prior: str = "", data_dir: Path = _DATA_DIR
+    ) -> "RatingsService":
+        return cls(
+            {
+                league: RatingsSnapshot.load(league, prior, data_dir)
+                for league in leagues
+            }
+        )
+
+    @property
+    def leagues(self) -> list[str]:
+        return list(self._indexes)
+
+    def reload(self, league: str, snapshot: RatingsSnapshot) -> None:
+        index = _RatingsIndex(snapshot)
+        self._indexes = {**self._indexes, league: index}
+
+    def player(self, league: str, player_id) -> dict | None:
+        index = self._indexes[league]
+        position = index.positions.get(str(player_id))
+        if position is None:
+            return None
+        return index.row(position)
+
+    def team(self, league: str, team_id: str) -> list[dict]:
+        """A team's players, best offense first"""
+        index = self._indexes[league]
+        return [index.row(p) for p in index.teams.get(str(team_id), [])]
+
+    def top(self, league: str, n: int = 25, by: _SortBy = "vpp") -> list[dict]:
+        if by not in _DESCENDING:
+            raise ValueError(f"Can only sort by {list(_DESCENDING)}, not {by}")
+        index = self._indexes[league]
+        return [index.row(p) for p in index.orders[by][:n]]
+
+
+def _sort_positions(values: np.ndarray, descending: bool) -> np.ndarray:
+    """Positions sorted by value, with NaNs last"""
+    keys = -values if descending else values
+    return np.argsort(np.where(np.isnan(keys), np.inf, keys), kind="stable")
+
+
+def serve(service: RatingsService, host: str = "127.0.0.1", port: int = 8000):
+    """Serve the queries as JSON over HTTP (until interrupted):
+
+    - GET /{league}/players/{player_id}
+    - GET /{league}/teams/{team_id}
+    - GET /{league}/top?n=25&by=vpp
+    """
+    server = make_server(service, host, port)
+    print(f"Serving ratings on http://{host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+def make_server(
+    service: RatingsService, host: str = "127.0.0.1", port: int = 0
+) -> ThreadingHTTPServer:
+    """An HTTP server for the service that hasn't started yet
+    (port 0 picks a free one, see server.server_port)"""
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):  # pylint: disable=invalid-name
+            url = urlparse(self.path)
+            try:
+                result = _route(service, url.path, parse_qs(url.query))
+            except (KeyError, ValueError) as error:
+                self._send(400, {"error": str(error)})
+                return
+            if result is None:
+                self._send(404, {"error": f"Nothing at {url.path}"})
+            else:
+                self._send(200, result)
+
+        def _send(self, status: int, body) -> None:
+            data = json.dumps(body, allow_nan=False).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+            pass
+
+    return ThreadingHTTPServer((host, port), _Handler)
+
+
+def _route(service: RatingsService, path: str, query: dict[str, list[str]]):
+    parts = [p for p in path.split("/") if p]
+    if len(parts) == 3 and parts[1] == "players":
+        return service.player(parts[0], parts[2])
+    if len(parts) == 3 and parts[1] == "teams":
+        return service.team(parts[0], parts[2])
+    if len(parts) == 2 and parts[1] == "top":
+        n = int(query.get("n", ["25"])[0])
+        by = query.get("by", ["vpp"])[0]
+        return service.top(parts[0], n, by)
+    return None
@@ -0,0 +1,145 @@
+# mypy: disable-error-code="arg-type"
+# because there's lots of pandas in here
+"""Share performance columns with worker processes through shared memory,
+instead of pickling a copy of them for every worker"""
+import weakref
+from multiprocessing.shared_memory import SharedMemory
+from types import TracebackType
+from typing import Mapping, NamedTuple
+import numpy as np
+import pandas as pd
+
+
+# Each column starts on a cache line
+_ALIGNMENT = 64
+
+
+class SharedColumn(NamedTuple):
+    name: str
+    # numpy's dtype string (ex: <f8), so it survives pickling as-is
+    dtype: str
+    offset: int
+
+
+class SharedPerformancesDescriptor(NamedTuple):
+    """Where to find the published columns. It's small, so send it to workers
+    (ex: as an argument or a pool initializer arg) instead of the data."""
+
+    segment_name: str
+    n_rows: int
+    columns: tuple[SharedColumn, ...]
+
+
+class SharedPerformances:
+    """Copies columns into one shared memory segment, which lives until close()
+
+    Use it as a context manager (the segment's also removed when this is
+    garbage collected or the process exits, whichever's first).
+    Workers should be started by this process (ex: a ProcessPoolExecutor),
+    so they share its resource tracker, which cleans up after a crash.
+
+    Parameters
+    ----------
+    performances
+        A DataFrame (ex: from build_combined_df) or column name -> 1D array.
+        Strings and other objects are stored as fixed width unicode.
+    columns, optional
+        Which columns to share (default: all of them)
+    """
+
+    def __init__(
+        self,
+        performances: pd.DataFrame | Mapping[str, np.ndarray],
+        columns: list[str] | None = None,
+    ) -> None:
+        arrays = {
+            name: _to_shareable(performances[name])
+            for name in (list(performances) if columns is None else columns)
+        }
+        lengths = {len(array) for array in arrays.values()}
+        if len(lengths) > 1:
+            raise ValueError(f"Columns have different lengths: {sorted(lengths)}")
+
+        shared_columns = []
+        size = 0
+        for name, array in arrays.items():
+            shared_columns.append(SharedColumn(name, array.dtype.str, size))
+            size += -(-array.nbytes // _ALIGNMENT) * _ALIGNMENT
+        # Segments can't be empty
+        self._segment = SharedMemory(create=True, size=max(size, 1))
+        self._finalizer = weakref.finalize(self, _release, self._segment)
+
+        self.descriptor = SharedPerformancesDescriptor(
+            segment_name=self._segment.name,
+            n_rows=lengths.pop() if lengths else 0,
+            columns=tuple(shared_columns),
+        )
+        for column, view in zip(
+            shared_columns, _get_views(self._segment, self.descriptor)
+        ):
+            view[:] = arrays[column.name]
+
+    def __enter__(self) -> "SharedPerformances":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Remove the segment. Workers that attached keep their mapping until they exit."""
+        self._finalizer()
+
+
+# Segments this process has attached, kept open for as long as it runs,
+# since closing one under a live numpy view isn't allowed
+_attached: dict[str, SharedMemory] = {}
+
+
+def attach_arrays(descriptor: SharedPerformancesDescriptor) -> dict[str, np.ndarray]:
+    """Read-only numpy views of the published columns, without copying them"""
+    if descriptor.segment_name not in _attached:
+        _attached[descriptor.segment_name] = SharedMemory(name=descriptor.segment_name)
+    views = _get_views(_attached[descriptor.segment_name], descriptor)
+    for view in views:
+        view.flags.writeable = False
+    return {column.name: view for column, view in zip(descriptor.columns, views)}
+
+
+def attach_data_frame(descriptor: SharedPerformancesDescriptor) -> pd.DataFrame:
+    """The published columns as a DataFrame
+    (backed by the shared arrays with pandas 2, a copy before that)"""
+    return pd.DataFrame(attach_arrays(descriptor), copy=False)
+
+
+def _to_shareable(values: pd.Series | np.ndarray) -> np.ndarray:
+    array = np.asarray(values)
+    if array.ndim != 1:
+        raise ValueError("Only 1D columns can be shared")
+    return array.astype(str) if array.dtype.hasobject else array
+
+
+def _get_views(
+    segment: SharedMemory, descriptor: SharedPerformancesDescriptor
+) -> list[np.ndarray]:
+    return [
+        np.ndarray(
+            descriptor.n_rows,
+            dtype=np.dtype(column.dtype),
+            buffer=segment.buf,
+            offset=column.offset,
+        )
+        for column in descriptor.columns
+    ]
+
+
+def _release(segment: SharedMemory) -> None:
+    segment.close()
+    try:
+        segment.unlink()
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,222 @@
+# mypy: disable-error-code="arg-type"
+# because there's lots of pandas in here
+from concurrent.futures import ProcessPoolExecutor
+import dill
+import numpy as np
+import pandas as pd
+
+from .allocator import PossessionAllocator
+from .team_strength import allocate_team_strengths
+
+
+_Rosters = dict[str, list[str]]
+_Schedule = list[tuple[str, str]]
+
+
+class MatchupSimulator:
+    """Monte Carlo games between teams, built up from player ratings
+
+    A team's offense (defense) is the possession-weighted average
+    of its players' offense (defense) ratings, using the allocator's shares
+    (by offense rating) for its roster. Its VPP in a game is its offense
+    plus the opponent's defense (positive defense = allowing more VPP),
+    plus normal game noise with sd game_vpp_sd.
+
+    Parameters
+    ----------
+    offense, defense
+        Ratings indexed by player_id, with vpp and vpp_var columns
+        (ex: data/{league}_player_ratings.csv and the _defense one)
+    allocator
+        Splits each team's possessions between its players
+    game_vpp_sd
+        sd of a team's VPP in one game around its true strength
+    """
+
+    def __init__(
+        self,
+        offense: pd.DataFrame,
+        defense: pd.DataFrame,
+        allocator: PossessionAllocator,
+        game_vpp_sd: float,
+    ) -> None:
+        self._offense = offense
+        self._defense = defense
+        self._allocator = allocator
+        self._game_vpp_sd = game_vpp_sd
+
+    def team_strengths(self, rosters: _Rosters) -> pd.DataFrame:
+        """Mean and variance of each team's offense and defense"""
+        team_ids = list(rosters)
+        roster_sizes = [len(rosters[t]) for t in team_ids]
+        player_ids = [p for t in team_ids for p in rosters[t]]
+        offense_vpp, offense_var = _lookup(self._offense, player_ids)
+        defense_vpp, defense_var = _lookup(self._defense, player_ids)
+        strengths = allocate_team_strengths(
+            self._allocator,
+            offense_vpp,
+            offense_var,
+            defense_vpp,
+            defense_var,
+            np.concatenate([[0], np.cumsum(roster_sizes)]),
+        )
+        return pd.DataFrame(
+            strengths,
+            columns=["offense_vpp", "offense_var", "defense_vpp", "defense_var"],
+            index=pd.Index(team_ids, name="team_id"),
+        )
+
+    def simulate_games(
+        self,
+        rosters: _Rosters,
+        schedule: _Schedule,
+        n_simulations: int = 100_000,
+        seed: int | np.random.SeedSequence = 0,
+        batch_size: int = 10_000,
+    ) -> pd.DataFrame:
+        """Simulate every (team, opponent) game in the schedule n_simulations times
+
+        Returns each game's probability that team beats opponent (by VPP),
+        and the mean and sd of the VPP margin.
+        """
+        n_games = len(schedule)
+        wins = np.zeros(n_games)
+        margin_sums = np.zeros(n_games)
+        margin_squares = np.zeros(n_games)
+        for margins in self._simulate_margins(
+            rosters, schedule, n_simulations, seed, batch_size
+        ):
+            wins += (margins > 0).sum(axis=0)
+            margin_sums += margins.sum(axis=0)
+            margin_squares += (margins**2).sum(axis=0)
+
+        mean_margin = margin_sums / n_simulations
+        return pd.DataFrame(
+            {
+                "team_id": [team for team, _ in schedule],
+                "opponent_id": [opponent for _, opponent in schedule],
+                "win_probability": wins / n_simulations,
+                "mean_margin": mean_margin,
+                "margin_sd": np.sqrt(margin_squares / n_simulations - mean_margin**2),
+            }
+        )
+
+    def simulate_season(
+        self,
+        rosters: _Rosters,
+        schedule: _Schedule,
+        n_simulations: int = 100_000,
+        seed: int | np.random.SeedSequence = 0,
+        batch_size: int = 10_000,
+    ) -> pd.DataFrame:
+        """Simulate a whole (remaining) schedule n_simulations times
+
+        Each simulation draws every team's true strength once,
+        so a team that's better than its ratings is better all season.
+        Returns each team's expected wins and 5th/50th/95th percentile wins.
+        """
+        team_ids = list(rosters)
+        n_teams = len(team_ids)
+        team_numbers = {team: i for i, team in enumerate(team_ids)}
+        home = np.array([team_numbers[team] for team, _ in schedule], dtype=int)
+        away = np.array([team_numbers[opponent] for _, opponent in schedule], dtype=int)
+
+        season_wins = []
+        for margins in self._simulate_margins(
+            rosters, schedule, n_simulations, seed, batch_size
+        ):
+            winners = np.where(margins > 0, home, away)
+            # Counted per (simulation, team), with each simulation's teams
+            # numbered after the ones before it
+            simulation_offsets = np.arange(len(margins))[:, None] * n_teams
+            season_wins.append(
+                np.bincount(
+                    (winners + simulation_offsets).ravel(),
+                    minlength=len(margins) * n_teams,
+                ).reshape(len(margins), n_teams)
+            )
+        all_wins = np.concatenate(season_wins)
+
+        low, median, high = np.percentile(all_wins, [5, 50, 95], axis=0)
+        return pd.DataFrame(
+            {
+                "expected_wins": all_wins.mean(axis=0),
+                "wins_5th": low,
+                "wins_50th": median,
+                "wins_95th": high,
+            },
+            index=pd.Index(team_ids, name="team_id"),
+        )
+
+    def _simulate_margins(
+        self,
+        rosters: _Rosters,
+        schedule: _Schedule,
+        n_simulations: int,
+        seed: int | np.random.SeedSequence,
+        batch_size: int,
+    ):
+        """(batch, n_games) VPP margins of team over opponent, batch by batch"""
+        strengths = self.team_strengths(rosters)
+        team_numbers = {team: i for i, team in enumerate(strengths.index)}
+        home = np.array([team_numbers[team] for team, _ in schedule])
+        away = np.array([team_numbers[opponent] for _, opponent in schedule])
+        n_teams = len(strengths)
+
+        rng = np.random.default_rng(seed)
+        for start in range(0, n_simulations, batch_size):
+            size = min(batch_size, n_simulations - start)
+            offense = rng.normal(
+                strengths.offense_vpp.to_numpy(),
+                np.sqrt(strengths.offense_var.to_numpy()),
+                size=(size, n_teams),
+            )
+            defense = rng.normal(
+                strengths.defense_vpp.to_numpy(),
+                np.sqrt(strengths.defense_var.to_numpy()),
+                size=(size, n_teams),
+            )
+            home_vpp = offense[:, home] + defense[:, away]
+            away_vpp = offense[:, away] + defense[:, home]
+            noise = rng.normal(0, self._game_vpp_sd, size=(2, size, len(schedule)))
+            yield home_vpp + noise[0] - away_vpp - noise[1]
+
+
+def simulate_slates(
+    simulator: MatchupSimulator,
+    rosters: _Rosters,
+    slates: list[_Schedule],
+    n_simulations: int = 100_000,
+    seed: int = 0,
+    n_workers: int | None = None,
+) -> list[pd.DataFrame]:
+    """simulate_games for each slate, one slate per process
+
+    Each slate gets its own stream of random numbers, spawned from seed
+    (like bootstrap's replicates), so slates' simulations are independent
+    """
+    payloads = [
+        dill.dumps((simulator, rosters, slate, n_simulations, slate_seed))
+        for slate, slate_seed in zip(
+            slates, np.random.SeedSequence(seed).spawn(len(slates))
+        )
+    ]
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        return list(executor.map(_simulate_slate, payloads))
+
+
+def _simulate_slate(payload: bytes) -> pd.DataFrame:
+    simulator, rosters, slate, n_simulations, seed = dill.loads(payload)
+    return simulator.simulate_games(rosters, slate, n_simulations, seed)
+
+
+def _lookup(
+    ratings: pd.DataFrame, player_ids: list[str]
+) -> tuple[np.ndarray, np.ndarray]:
+    """Ratings for each player, with unrated players getting
+    the median rating and the most uncertain variance"""
+    found = ratings.reindex(player_ids)
+    return (
+        found.vpp.fillna(ratings.vpp.median()).to_numpy(),
+        found.vpp_var.fillna(ratings.vpp_var.max()).to_numpy(),
+    )
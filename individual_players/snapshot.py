@@ -0,0 +1,191 @@
+"""Versioned binary ratings snapshots that can be opened with np.memmap
+
+Layout (little endian, every section starts on an 8 byte boundary):
+
+- header: magic, format version, id kind (0 = int64, 1 = fixed width bytes),
+  id width in bytes, number of channels, number of players
+- channel names, 32 bytes each (ex: offense, defense, adjusted_offense)
+- player ids
+- for each channel, float64 vpp then float64 vpp_var, lined up with the ids
+"""
+import os
+import tempfile
+from pathlib import Path
+from typing import NamedTuple
+import numpy as np
+import pandas as pd
+
+
+SNAPSHOT_VERSION = 1
+
+_MAGIC = b"VPPSNAP\0"
+_HEADER = np.dtype(
+    [
+        ("magic", "S8"),
+        ("version", "<u4"),
+        ("id_kind", "<u4"),
+        ("id_width", "<u4"),
+        ("n_channels", "<u4"),
+        ("n_players", "<u8"),
+    ]
+)
+_CHANNEL_NAME = np.dtype("S32")
+_INT_IDS = 0
+_BYTES_IDS = 1
+
+
+class SnapshotChannel(NamedTuple):
+    vpp: np.ndarray
+    vpp_var: np.ndarray
+
+
+def write_snapshot(
+    path: str | Path,
+    player_ids: np.ndarray,
+    channels: dict[str, SnapshotChannel],
+) -> None:
+    """Write a snapshot, replacing any file that's already at path all at once
+    (it's written to a temporary file next to it first)"""
+    player_ids = np.asarray(player_ids)
+    n_players = len(player_ids)
+    if np.issubdtype(player_ids.dtype, np.integer):
+        ids = player_ids.astype("<i8")
+        id_kind = _INT_IDS
+    else:
+        ids = np.char.encode(player_ids.astype(str), "utf-8")
+        id_kind = _BYTES_IDS
+
+    header = np.zeros(1, dtype=_HEADER)
+    header[0] = (
+        _MAGIC,
+        SNAPSHOT_VERSION,
+        id_kind,
+        ids.dtype.itemsize,
+        len(channels),
+        n_players,
+    )
+    encoded_names = [name.encode() for name in channels]
+    for name, encoded in zip(channels, encoded_names):
+        # Longer ones would be cut off, and could end up with the same name
+        if len(encoded) > _CHANNEL_NAME.itemsize:
+            raise ValueError(
+                f"Channel names can be at most {_CHANNEL_NAME.itemsize} bytes, "
+                f"not {len(encoded)} ({name})"
+            )
+    names = np.array(encoded_names, dtype=_CHANNEL_NAME)
+
+    path = Path(path)
+    with tempfile.NamedTemporaryFile(dir=path.parent, delete=False) as file:
+        try:
+            for section in [header, names, ids]:
+                file.write(section.tobytes())
+                file.write(b"\0" * (-file.tell() % 8))
+            for channel in channels.values():
+                for values in channel:
+                    values = np.asarray(values, dtype="<f8")
+                    if values.shape != (n_players,):
+                        raise ValueError(
+                            f"Channel arrays need to have {n_players} values, "
+                            f"not {values.shape}"
+                        )
+                    file.write(values.tobytes())
+            file.flush()
+            os.fsync(file.fileno())
+            # Temporary files are only readable by their owner,
+            # and os.replace keeps that, so give it a normal file's mode
+            os.chmod(file.name, 0o666 & ~_get_umask())
+        except BaseException:
+            os.unlink(file.name)
+            raise
+    os.replace(file.name, path)
+
+
+def _get_umask() -> int:
+    """The only way to read it is to set it, so it's put right back"""
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+class RatingsSnapshotFile:
+    """A snapshot opened read-only with np.memmap, so nothing's parsed or copied
+    until it's used"""
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        header = np.fromfile(self.path, dtype=_HEADER, count=1)
+        if len(header) == 0 or header[0]["magic"] != _MAGIC.rstrip(b"\0"):
+            raise ValueError(f"{self.path} isn't a ratings snapshot")
+        header = header[0]
+        self.version = int(header["version"])
+        if self.version != SNAPSHOT_VERSION:
+            raise ValueError(
+                f"{self.path} is snapshot version {self.version}, "
+                f"but this reads version {SNAPSHOT_VERSION}"
+            )
+        n_channels = int(header["n_channels"])
+        n_players = int(header["n_players"])
+
+        offset = _HEADER.itemsize
+        names = np.fromfile(
+            self.path, dtype=_CHANNEL_NAME, count=n_channels, offset=offset
+        )
+        offset = _align(offset + names.nbytes)
+        id_dtype = (
+            np.dtype("<i8")
+            if header["id_kind"] == _INT_IDS
+            else np.dtype(f"S{header['id_width']}")
+        )
+        self.player_ids = self._map(id_dtype, offset, n_players)
+        offset = _align(offset + id_dtype.itemsize * n_players)
+
+        self._channels: dict[str, SnapshotChannel] = {}
+        for name in names:
+            self._channels[name.decode()] = SnapshotChannel(
+                self._map(np.dtype("<f8"), offset, n_players),
+                self._map(np.dtype("<f8"), offset + 8 * n_players, n_players),
+            )
+            offset += 16 * n_players
+
+    @property
+    def channels(self) -> list[str]:
+        return list(self._channels)
+
+    def __getitem__(self, channel: str) -> SnapshotChannel:
+        return self._channels[channel]
+
+    def to_data_frame(self, channel: str) -> pd.DataFrame:
+        """One channel like current_teams.py's CSVs (vpp and vpp_var by player)"""
+        vpp, vpp_var = self._channels[channel]
+        player_ids = self.player_ids
+        if player_ids.dtype.kind == "S":
+            player_ids = np.char.decode(player_ids, "utf-8")
+        return pd.DataFrame(
+            {"vpp": np.asarray(vpp), "vpp_var": np.asarray(vpp_var)},
+            index=np.asarray(player_ids),
+        )
+
+    def _map(self, dtype: np.dtype, offset: int, n_values: int) -> np.ndarray:
+        if n_values == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(
+            self.path, dtype=dtype, mode="r", offset=offset, shape=(n_values,)
+        )
+
+
+def ratings_to_channel(
+    ratings: dict | pd.DataFrame, player_ids: np.ndarray
+) -> SnapshotChannel:
+    """Line up a {player_id: (vpp, vpp_var)} lookup
+    (or a DataFrame with vpp and vpp_var columns) with player_ids,
+    with NaN for anybody that's missing"""
+    if not isinstance(ratings, pd.DataFrame):
+        ratings = pd.DataFrame(ratings).T.rename(columns={0: "vpp", 1: "vpp_var"})
+    lined_up = ratings.reindex(player_ids)
+    return SnapshotChannel(
+        lined_up.vpp.to_numpy(dtype=float), lined_up.vpp_var.to_numpy(dtype=float)
+    )
+
+
+def _align(offset: int) -> int:
+    return offset + (-offset % 8)
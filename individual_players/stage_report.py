@@ -0,0 +1,140 @@
+"""Time, memory and row counts for each stage of a script, saved as JSON,
+so when the data grows it's easy to see which stage got slower"""
+import json
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from types import TracebackType
+from typing import Iterator, NamedTuple
+
+
+# Set this to a folder to get a report from every run of the scripts,
+# without passing each one a report_dir
+REPORT_DIR_ENV_VAR = "STAGE_REPORT_DIR"
+
+
+class StageStats(NamedTuple):
+    name: str
+    wall_seconds: float
+    # Only this process (ex: not a pool's workers)
+    cpu_seconds: float
+    # Most memory Python had allocated at once during the stage (from tracemalloc),
+    # again only in this process
+    peak_memory_bytes: int
+    n_rows: int | None
+
+
+class RunningStage:
+    """What `with report.stage(name) as stage` gives you,
+    to record how many rows the stage handled (ex: stage.n_rows = len(df))"""
+
+    def __init__(self) -> None:
+        self.n_rows: int | None = None
+        # Filled in by the report
+        self.peak_memory_bytes = 0
+
+
+class StageReport:
+    """Collects StageStats for a run of a script, and saves them when it's done
+
+    Does nothing (and costs nothing) unless it's given a report_dir
+    or REPORT_DIR_ENV_VAR is set, since tracing memory slows Python down.
+    Use it as a context manager, to save the report even if the script fails.
+
+    Parameters
+    ----------
+    script
+        Goes in the report's file name: {report_dir}/{script}_{start time}.json
+    report_dir, optional
+        Where to save the report (default: $STAGE_REPORT_DIR, if it's set)
+    """
+
+    def __init__(self, script: str, report_dir: str | Path | None = None) -> None:
+        report_dir = report_dir or os.environ.get(REPORT_DIR_ENV_VAR)
+        self.script = script
+        self.report_dir = Path(report_dir) if report_dir else None
+        self.stages: list[StageStats] = []
+        self._started = datetime.now()
+        self._running: list[RunningStage] = []
+
+    @property
+    def enabled(self) -> bool:
+        return self.report_dir is not None
+
+    def __enter__(self) -> "StageReport":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.save()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[RunningStage]:
+        """Measure the code in the with block. Stages can be nested."""
+        running = RunningStage()
+        if not self.enabled:
+            yield running
+            return
+
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        elif self._running:
+            # Resetting the peak below would lose the outer stage's peak so far
+            self._record_peak(self._running[-1])
+        tracemalloc.reset_peak()
+        self._running.append(running)
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            yield running
+        finally:
+            wall_seconds = time.perf_counter() - wall_start
+            cpu_seconds = time.process_time() - cpu_start
+            self._running.pop()
+            self._record_peak(running)
+            if self._running:
+                self._running[-1].peak_memory_bytes = max(
+                    self._running[-1].peak_memory_bytes, running.peak_memory_bytes
+                )
+            if started_tracing:
+                tracemalloc.stop()
+            self.stages.append(
+                StageStats(
+                    name,
+                    wall_seconds,
+                    cpu_seconds,
+                    running.peak_memory_bytes,
+                    running.n_rows,
+                )
+            )
+
+    def save(self) -> Path | None:
+        """Write the report, returning its path (None if it isn't enabled)"""
+        if self.report_dir is None:
+            return None
+        self.report_dir.mkdir(parents=True, exist_ok=True)
+        path = self.report_dir / f"{self.script}_{self._started:%Y%m%d_%H%M%S}.json"
+        report = {
+            "script": self.script,
+            "started": self._started.isoformat(),
+            "wall_seconds": (datetime.now() - self._started).total_seconds(),
+            "stages": [stats._asdict() for stats in self.stages],
+        }
+        temp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+        temp_path.replace(path)
+        return path
+
+    @staticmethod
+    def _record_peak(running: RunningStage) -> None:
+        running.peak_memory_bytes = max(
+            running.peak_memory_bytes, tracemalloc.get_traced_memory()[1]
+        )
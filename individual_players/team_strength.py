@@ -0,0 +1,185 @@
+# mypy: disable-error-code="arg-type"
+# because there's lots of pandas in here
+from typing import NamedTuple
+import numpy as np
+import pandas as pd
+
+from .allocator import PossessionAllocator
+from .columnar import ColumnarBuffer
+from .priors import Player
+from .ratings import PlayerRatings
+from .types import RatingsLookup
+
+
+_STRENGTH_COLUMNS = ["offense_vpp", "offense_var", "defense_vpp", "defense_var"]
+
+
+class TeamStrength(NamedTuple):
+    offense_vpp: float
+    offense_var: float
+    defense_vpp: float
+    defense_var: float
+
+    @property
+    def net_vpp(self) -> float:
+        """Offense minus defense (positive defense = allowing more VPP)"""
+        return self.offense_vpp - self.defense_vpp
+
+
+def allocate_team_strengths(
+    allocator: PossessionAllocator,
+    offense_vpp: np.ndarray,
+    offense_var: np.ndarray,
+    defense_vpp: np.ndarray,
+    defense_var: np.ndarray,
+    team_offsets: np.ndarray,
+) -> np.ndarray:
+    """Possession-weighted team ratings for many rosters at once
+
+    Players are laid out like PossessionAllocator.allocate_batch,
+    and get the allocator's share of their team's possessions (by offense rating).
+    A team's mean is the share-weighted sum of its players' means,
+    and its variance is the squared-share-weighted sum of their variances.
+
+    Returns
+    -------
+    (n_teams, 4) array of offense_vpp, offense_var, defense_vpp, defense_var
+    """
+    team_offsets = np.asarray(team_offsets)
+    team_sizes = np.diff(team_offsets)
+    team_index = np.repeat(np.arange(len(team_sizes)), team_sizes)
+    _, shares = allocator.allocate_batch(offense_vpp, team_offsets)
+    weights = np.stack([shares, shares**2, shares, shares**2])
+    values = np.stack([offense_vpp, offense_var, defense_vpp, defense_var])
+    return np.stack(
+        [
+            np.bincount(team_index, weights=w * v, minlength=len(team_sizes))
+            for w, v in zip(weights, values)
+        ],
+        axis=1,
+    )
+
+
+class TeamStrengthCache:
+    """Each team's strength, kept up to date as update_loop goes through games
+
+    Pass it to update_loop, and after every game it recomputes just
+    the two teams that played, from that game's roster and their players'
+    updated ratings. So it can be read at any point in the loop
+    (ex: from a callback) without rebuilding the whole league.
+
+    Parameters
+    ----------
+    allocator
+        Splits each team's possessions between its players
+    defense_ratings, optional
+        Player defense ratings that are updated during the loop
+        (ex: DefenseAdjustedCallback.defense_ratings).
+        Without them, every team's defense is 0.
+    """
+
+    def __init__(
+        self,
+        allocator: PossessionAllocator,
+        defense_ratings: RatingsLookup | None = None,
+    ) -> None:
+        self._allocator = allocator
+        self._defense_ratings = defense_ratings
+        self._team_numbers: dict[str, int] = {}
+        self._strengths = np.empty((0, len(_STRENGTH_COLUMNS)))
+        self._history = ColumnarBuffer(
+            {"game_id": None, "team_id": None, **{c: float for c in _STRENGTH_COLUMNS}}
+        )
+
+    def update_game(
+        self,
+        game_id: str,
+        rosters: dict[str, np.ndarray],
+        player_ratings: PlayerRatings,
+    ) -> None:
+        """Recompute the teams in a game, from their rosters (team_id -> player_ids)
+        and their players' ratings after the game"""
+        team_ids = list(rosters)
+        player_ids = np.concatenate([rosters[t] for t in team_ids])
+        roster_sizes = [len(rosters[t]) for t in team_ids]
+        player_teams = np.repeat(team_ids, roster_sizes)
+
+        offense_vpp, offense_var = np.array(
+            [
+                player_ratings.get_rating(Player(pid, team_id))
+                for pid, team_id in zip(player_ids, player_teams)
+            ]
+        ).T
+        if self._defense_ratings is None:
+            defense_vpp = defense_var = np.zeros(len(player_ids))
+        else:
+            defense_vpp, defense_var = np.array(
+                [self._defense_ratings[pid] for pid in player_ids]
+            ).T
+
+        strengths = allocate_team_strengths(
+            self._allocator,
+            offense_vpp,
+            offense_var,
+            defense_vpp,
+            defense_var,
+            np.concatenate([[0], np.cumsum(roster_sizes)]),
+        )
+        for team_id, strength in zip(team_ids, strengths):
+            team_number = self._get_team_number(team_id)
+            self._strengths[team_number] = strength
+            self._history.append(game_id, team_id, *strength)
+
+    def get(self, team_id: str) -> TeamStrength:
+        return TeamStrength(*self._strengths[self._team_numbers[team_id]])
+
+    def __contains__(self, team_id: str) -> bool:
+        return team_id in self._team_numbers
+
+    def to_data_frame(self) -> pd.DataFrame:
+        """Every team's current strength, best (by net_vpp) first"""
+        strengths = pd.DataFrame(
+            self._strengths[: len(self._team_numbers)],
+            columns=_STRENGTH_COLUMNS,
+            index=pd.Index(list(self._team_numbers), name="team_id"),
+        )
+        strengths["net_vpp"] = strengths.offense_vpp - strengths.defense_vpp
+        return strengths.sort_values("net_vpp", ascending=False)
+
+    @property
+    def history(self) -> pd.DataFrame:
+        """Each team's strength after each of its games"""
+        return self._history.to_data_frame()
+
+    def snapshots(self, performances: pd.DataFrame, column: str) -> pd.DataFrame:
+        """Every team's latest strength as of each value of a column
+        that's constant within a game and increases with game_id (ex: a date)
+
+        Returns a DataFrame indexed by (column, team_id),
+        only including teams that had played by then.
+        """
+        game_keys = performances[["game_id", column]].drop_duplicates("game_id")
+        history = self.history.merge(game_keys, on="game_id")
+        latest = history.groupby([column, "team_id"])[_STRENGTH_COLUMNS].last()
+        everything = pd.MultiIndex.from_product(
+            [latest.index.levels[0], latest.index.levels[1]], names=latest.index.names
+        )
+        return (
+            latest.reindex(everything)
+            .groupby(level="team_id")
+            .ffill()
+            .dropna(subset=["offense_vpp"])
+        )
+
+    def _get_team_number(self, team_id: str) -> int:
+        team_number = self._team_numbers.get(team_id)
+        if team_number is not None:
+            return team_number
+        team_number = self._team_numbers[team_id] = len(self._team_numbers)
+        if team_number == len(self._strengths):
+            grown = np.empty(
+                (max(2 * len(self._strengths), 64), len(_STRENGTH_COLUMNS))
+            )
+            grown[:team_number] = self._strengths
+            self._strengths = grown
+        return team_number
@@ -6,7 +6,10 @@ import numpy as np
 from dataclasses_json import DataClassJsonMixin
 from sklearn import linear_model
 
+from .binned_stats import BinnedStats, assign_bins
 
+
+_PLAYER_COLUMN = "player"
 _VALUE_COLUMN = "value"
 _POSSESSIONS_COLUMN = "possessions"
 _VPP_COLUMN = "vpp"
@@ -50,20 +53,14 @@ def _fit_vpp_std(values_df: pd.DataFrame) -> _FitResult:
     # Because I want to ignore games with fewer than 10 possessions
     # and 110 is a reasonable max
     breaks = np.arange(10, 105, 5)
-    min_possessions = []
-    vpp_std = []
-    for i in range(len(breaks) - 1):
-        start, end = breaks[i : i + 2]
-        game_vs_career = values_df[_VPP_COLUMN] - values_df[_VPP_CAREER_COLUMN]
-        game_vs_career = game_vs_career[
-            np.logical_and(
-                values_df[_POSSESSIONS_COLUMN] >= start,
-                values_df[_POSSESSIONS_COLUMN] < end,
-            )
-        ]
-        game_vs_career = game_vs_career[np.isfinite(game_vs_career)]
-        min_possessions.append(start)
-        vpp_std.append(game_vs_career.std())
+    game_vs_career = (values_df[_VPP_COLUMN] - values_df[_VPP_CAREER_COLUMN]).to_numpy()
+    bin_ids = assign_bins(values_df[_POSSESSIONS_COLUMN].to_numpy(), breaks)
+    in_range = np.logical_and(bin_ids >= 0, np.isfinite(game_vs_career))
+    binned = BinnedStats.from_values(
+        bin_ids[in_range], game_vs_career[in_range], len(breaks) - 1
+    )
+    min_possessions = breaks[:-1].tolist()
+    vpp_std = binned.std.tolist()
 
     regression = linear_model.LinearRegression()
     data = np.stack([np.power(min_possessions, i) for i in range(4)], axis=1)
@@ -82,13 +79,17 @@ def fit_params(
     """
     Build parameters we'll use in "update" scripts
     """
-    values_df = pd.read_csv(values_csv_path)
+    values_df = pd.read_csv(
+        values_csv_path,
+        usecols=[_PLAYER_COLUMN, _VALUE_COLUMN, _POSSESSIONS_COLUMN],
+        dtype={_VALUE_COLUMN: np.float64, _POSSESSIONS_COLUMN: np.float64},
+    )
     values_df["vpp"] = values_df[_VALUE_COLUMN] / values_df[_POSSESSIONS_COLUMN]
 
     # Add in the career average VPP to each row
     career_averages = (
-        values_df.groupby("player")
-        .agg("sum")[[_VALUE_COLUMN, _POSSESSIONS_COLUMN]]
+        values_df.groupby(_PLAYER_COLUMN)[[_VALUE_COLUMN, _POSSESSIONS_COLUMN]]
+        .sum()
         .reset_index()
         .reset_index()
     )
@@ -97,7 +98,7 @@ def fit_params(
     )
     career_averages = career_averages[career_averages[_POSSESSIONS_COLUMN] > 100]
     values_df = values_df.merge(
-        career_averages, on="player", suffixes=("", _CAREER_SUFFIX)
+        career_averages, on=_PLAYER_COLUMN, suffixes=("", _CAREER_SUFFIX)
     )
 
     fit_result = _fit_vpp_std(values_df)
@@ -0,0 +1,19 @@
+from fire import Fire
+
+from individual_players import LeagueModel, build_combined_df
+from individual_players.joint_solver import solve_joint_ratings
+
+
+def main(league: str, prior: str = ""):
+    """Retrospective offense and defense ratings, solved all at once
+    instead of game by game like current_teams.py"""
+    performances = build_combined_df(league)
+    model = LeagueModel.load(f"./models/{league}.pkl")
+    defense_model = LeagueModel.load(f"./models/{league}_defense{prior}.pkl")
+    offense, defense = solve_joint_ratings(performances, model, defense_model)
+    offense.to_csv(f"data/{league}_player_ratings_joint{prior}.csv")
+    defense.to_csv(f"data/{league}_player_ratings_defense_joint{prior}.csv")
+
+
+if __name__ == "__main__":
+    Fire(main)
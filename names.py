@@ -1,20 +1,23 @@
 import asyncio
+import os
 import re
-from functools import partial
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Iterable, NamedTuple, Optional
 import pandas as pd
 from bs4 import BeautifulSoup, Tag
 from fire import Fire
 
-from endgame.web import get
+from individual_players.http_cache import CachedClient
+from individual_players.snapshot import RatingsSnapshotFile
+from individual_players.stage_report import StageReport
 
 
-_PARALLEL_MAX = asyncio.Semaphore(10)
+_ESPN = "https://www.espn.com"
 
 
-def _build_link(league: str, player_id: str) -> str:
-    return f"https://www.espn.com/{league}-college-basketball/player/_/id/{player_id}"
+def _build_link(league: str, player_id: int | str, base_url: str = _ESPN) -> str:
+    return f"{base_url}/{league}-college-basketball/player/_/id/{player_id}"
 
 
 def _get_team_link(league: str, raw, team_info) -> Optional[str]:
@@ -28,11 +31,10 @@ def _get_team_link(league: str, raw, team_info) -> Optional[str]:
     return None
 
 
-async def _get_player_info(league: str, player_id: str) -> dict:
-    url = _build_link(league, player_id)
-    async with _PARALLEL_MAX:
-        response = await get(url)
-    soup = BeautifulSoup(response.data, features="html.parser")
+def _parse_player_info(
+    league: str, player_id: int | str, data: bytes, parser: str = "html.parser"
+) -> dict:
+    soup = BeautifulSoup(data, features=parser)
 
     player_name = " ".join(
         span.text for span in soup.select("h1.PlayerHeader__Name span")
@@ -50,7 +52,7 @@ async def _get_player_info(league: str, player_id: str) -> dict:
         position = pieces[0].text.strip()
         number = "?"
 
-    if team_link := _get_team_link(league, response.data.decode(), team_info):
+    if team_link := _get_team_link(league, data.decode(), team_info):
         team_id, team_name = team_link.split("/")[-2:]
     else:
         # TODO: find other ways...I think there's other links to the team page in here
@@ -60,7 +62,6 @@ async def _get_player_info(league: str, player_id: str) -> dict:
     other_columns = dict(
         _get_column_value(item) for item in soup.select("ul.PlayerHeader__Bio_List li")
     )
-    await response.save_if_necessary()
 
     return {
         "player_id": player_id,
@@ -83,11 +84,13 @@ def _get_column_value(item: Tag) -> tuple[str, str]:
     return name, value
 
 
-async def _try_get_player_info(league: str, player_id: str) -> Optional[dict]:
+def _try_parse_player_info(
+    league: str, player_id: int | str, data: bytes, parser: str, url: str
+) -> Optional[dict]:
     try:
-        return await _get_player_info(league, player_id)
+        return _parse_player_info(league, player_id, data, parser)
     except Exception as error:
-        print(f"Problem with {_build_link(league, player_id)} {str(error)}")
+        print(f"Problem with {url} {str(error)}")
         return None
 
 
@@ -95,6 +98,9 @@ _LEAGUES = ["mens", "womens"]
 
 
 def _get_all_player_ids(league: str) -> list[int]:
+    snapshot_path = Path("data", f"{league}_player_ratings.snapshot")
+    if snapshot_path.exists():
+        return RatingsSnapshotFile(snapshot_path).player_ids.astype(int).tolist()
     player_ratings = pd.read_csv(f"./data/{league}_player_ratings.csv", index_col=0)
     return [int(i) for i in player_ratings.index]
 
@@ -102,33 +108,211 @@ def _get_all_player_ids(league: str) -> list[int]:
 def _get_starting_point(csv_path: Path) -> tuple[pd.DataFrame, set[int]]:
     if not csv_path.exists():
         return pd.DataFrame(), set()
-    starting = pd.read_csv(csv_path)
+    starting = pd.read_csv(csv_path, index_col=0)
     return starting, {int(pid) for pid in starting.player_id}
 
 
-async def main():
+class _Checkpoint:
+    """Saves what's been found so far (call it), appending only the players
+    added since the last save, so each save costs about the same
+
+    The header's only written when the file is (re)written, which is also
+    what happens if a player has a bio field nobody in the file had before.
+    """
+
+    def __init__(self, output_path: Path, so_far: pd.DataFrame, added: list[dict]):
+        self._output_path = output_path
+        self._columns = list(so_far.columns)
+        self._n_in_file = len(so_far)
+        self._added = added
+        self._n_saved = 0
+
+    def __call__(self) -> None:
+        new = pd.DataFrame(self._added[self._n_saved :])
+        if new.empty:
+            return
+        new.index += self._n_in_file
+        if self._columns and set(new.columns) <= set(self._columns):
+            # One write, so a crash can at most cut off the last rows
+            rows = new.reindex(columns=self._columns).to_csv(header=False)
+            with open(self._output_path, "a", encoding="utf-8", newline="") as file:
+                file.write(rows)
+        else:
+            self._rewrite(new)
+        self._n_in_file += len(new)
+        self._n_saved = len(self._added)
+
+    def _rewrite(self, new: pd.DataFrame) -> None:
+        """Write the whole file with a new header,
+        swapping it in all at once so a crash never leaves half a file"""
+        if self._n_in_file:
+            new = pd.concat(
+                [pd.read_csv(self._output_path, index_col=0), new], ignore_index=True
+            )
+        temp_path = self._output_path.with_suffix(".csv.tmp")
+        new.to_csv(temp_path, encoding="utf-8")
+        temp_path.replace(self._output_path)
+        self._columns = list(new.columns)
+
+
+class _Options(NamedTuple):
+    base_url: str
+    checkpoint_every: int
+    parser: str
+    # Downloads in flight at once
+    n_fetchers: int
+
+
+async def _fetch_pages(
+    league: str,
+    player_ids: Iterable[int],
+    client: CachedClient,
+    pages: asyncio.Queue,
+    options: _Options,
+):
+    """Download every player's page onto the queue, options.n_fetchers at a time,
+    each waiting whenever the parsers are behind so pages don't pile up in memory"""
+    remaining = iter(player_ids)
+
+    async def _fetch_remaining():
+        # The fetchers share the iterator, so each id is only fetched once
+        for player_id in remaining:
+            url = _build_link(league, player_id, options.base_url)
+            try:
+                data = await client.get(url)
+            except Exception as error:
+                print(f"Problem with {url} {str(error)}")
+                continue
+            await pages.put((player_id, data, url))
+
+    await asyncio.gather(*(_fetch_remaining() for _ in range(options.n_fetchers)))
+
+
+async def _parse_pages(
+    league: str,
+    pages: asyncio.Queue,
+    pool: ProcessPoolExecutor,
+    added: list[dict],
+    save: Callable[[], None],
+    options: _Options,
+):
+    """Parse pages from the queue in the process pool until it hands back None"""
+    loop = asyncio.get_running_loop()
+    while (page := await pages.get()) is not None:
+        player_id, data, url = page
+        player_info = await loop.run_in_executor(
+            pool,
+            _try_parse_player_info,
+            league,
+            player_id,
+            data,
+            options.parser,
+            url,
+        )
+        if player_info is None:
+            continue
+        added.append(player_info)
+        if len(added) % options.checkpoint_every == 0:
+            save()
+
+
+async def _scrape(
+    league: str,
+    player_ids: Iterable[int],
+    client: CachedClient,
+    pool: ProcessPoolExecutor,
+    n_parsers: int,
+    added: list[dict],
+    save: Callable[[], None],
+    options: _Options,
+):
+    """Fetch and parse every player's page, adding what's found to added"""
+    pages: asyncio.Queue = asyncio.Queue(maxsize=4 * n_parsers)
+    parsers = [
+        asyncio.create_task(_parse_pages(league, pages, pool, added, save, options))
+        for _ in range(n_parsers)
+    ]
+
+    async def _fetch_then_stop_parsers():
+        await _fetch_pages(league, player_ids, client, pages, options)
+        for _ in parsers:
+            await pages.put(None)
+
+    tasks = [asyncio.create_task(_fetch_then_stop_parsers()), *parsers]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        # Ex: a parser died with the process pool,
+        # and the fetchers would wait on a full queue forever
+        for task in tasks:
+            task.cancel()
+        raise
+
+
+async def _main(
+    client: CachedClient,
+    pool: ProcessPoolExecutor,
+    n_parsers: int,
+    options: _Options,
+    report: StageReport,
+):
+    async with client:
+        for league in _LEAGUES:
+            with report.stage(f"load_{league}") as stage:
+                player_ids = _get_all_player_ids(league)
+                output_path = Path("data", f"{league}_player_info.csv")
+                so_far, done_ids = _get_starting_point(output_path)
+                stage.n_rows = len(player_ids)
+
+            with report.stage(f"scrape_{league}") as stage:
+                to_get = filter(lambda pid: pid not in done_ids, player_ids)
+                added: list[dict] = []
+                save = _Checkpoint(output_path, so_far, added)
+                await _scrape(
+                    league, to_get, client, pool, n_parsers, added, save, options
+                )
+                stage.n_rows = len(added)
+
+            print(f"Found {len(added)} more players")
+            with report.stage(f"save_{league}") as stage:
+                save()
+                stage.n_rows = len(so_far) + len(added)
+
+
+def main(
+    base_url: str = _ESPN,
+    cache_dir: str = "data/web_cache",
+    cache_days: float = 30,
+    checkpoint_every: int = 100,
+    per_host_limit: int = 10,
+    n_parsers: int | None = None,
+    parser: str = "html.parser",
+    report_dir: str | None = None,
+):
     """Get a .csv that has some data on every player.
 
     This is meant to be re-run occasionally, and will only get the web page
     for new players/players it previously failed on.
+    Pages are cached in cache_dir for cache_days, and what's been found so far
+    is saved every checkpoint_every players, so a crash doesn't lose much.
+    Pages are parsed in n_parsers processes (default: one per core),
+    with BeautifulSoup's parser (ex: lxml, if it's installed, is faster).
 
     There's probably more info you could parse in here,
     and definitely some edge cases that can be handled.
     I figure this is a fine start, and if important players end up with ?'s,
     then I can do something about it
+
+    A timing/memory report of each stage is saved to report_dir, if it's given
+    (see StageReport).
     """
-    for league in _LEAGUES:
-        player_ids = _get_all_player_ids(league)
-        output_path = Path("data", f"{league}_player_info.csv")
-        so_far, done_ids = _get_starting_point(output_path)
-
-        to_get = filter(lambda pid: pid not in done_ids, player_ids)
-        tasks = map(partial(_try_get_player_info, league), to_get)
-        player_infos = await asyncio.gather(*tasks)
-        added = pd.DataFrame([i for i in player_infos if i is not None])
-        print(f"Found {len(added)} more players")
-
-        pd.concat([so_far, added]).to_csv(output_path)
+    n_parsers = n_parsers or os.cpu_count() or 1
+    client = CachedClient(cache_dir, cache_days * 24 * 60 * 60, per_host_limit)
+    options = _Options(base_url, checkpoint_every, parser, per_host_limit)
+    with StageReport("names", report_dir) as report, ProcessPoolExecutor(
+        max_workers=n_parsers
+    ) as pool:
+        asyncio.run(_main(client, pool, n_parsers, options, report))
 
 
 if __name__ == "__main__":
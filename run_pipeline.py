@@ -0,0 +1,195 @@
+import asyncio
+from functools import partial
+import pandas as pd
+from fire import Fire
+
+from individual_players import LeagueModel, build_combined_df, build_prior_getter
+from individual_players.model_fits import (
+    build_team_priors,
+    fit_adjusted_model,
+    fit_defense_model,
+)
+from individual_players.pipeline import Stage, run_pipeline
+
+
+_LEAGUES = ["mens", "womens"]
+_PRIORS = ["", "_team_prior"]
+
+
+def main(
+    n_workers: int | None = None,
+    force: bool = False,
+    download: bool = False,
+    scrape_names: bool = True,
+):
+    """The whole README runbook in one command
+
+    Stages only rerun when their inputs changed since they last ran
+    (tracked in models/pipeline_state.json), and independent ones
+    (ex: the two leagues) run at the same time.
+
+    Parameters
+    ----------
+    n_workers, optional
+        Most stages to run at once (default: one per core)
+    force, optional
+        Rerun everything, even if it's up to date
+    download, optional
+        Start by pulling the latest performances from S3
+    scrape_names, optional
+        Run names.py when the ratings change
+    """
+    ran = run_pipeline(
+        _build_stages(download, scrape_names), n_workers=n_workers, force=force
+    )
+    print(f"Ran {len(ran)} stages: {ran}")
+
+
+def _build_stages(download: bool, scrape_names: bool) -> list[Stage]:
+    stages = []
+    if download:
+        stages.append(
+            Stage(
+                "download",
+                _download,
+                [],
+                [f"data/all_performances_{league}_*.csv" for league in _LEAGUES],
+                always_run=True,
+            )
+        )
+    for league in _LEAGUES:
+        performances = f"data/all_performances_{league}_*.csv"
+        model = f"models/{league}.pkl"
+        stages += [
+            Stage(
+                f"vpp_model_{league}",
+                partial(_fit_vpp_model, league),
+                [performances],
+                [model, f"models/{league}_league_state.npz"],
+            ),
+            Stage(
+                f"allocator_{league}",
+                partial(_fit_allocator, league),
+                [performances, model],
+                [f"models/{league}_allocator.pkl"],
+            ),
+            Stage(
+                f"team_priors_{league}",
+                partial(_build_team_priors, league),
+                [
+                    performances,
+                    f"data/{league}_player_ratings.csv",
+                    f"data/{league}_player_info.csv",
+                ],
+                [f"data/{league}_team_priors.csv"],
+            ),
+        ]
+        for prior in _PRIORS:
+            # The team prior variants also use the team priors to fit
+            team_priors = [f"data/{league}_team_priors.csv"] if prior else []
+            defense_model = f"models/{league}_defense{prior}.pkl"
+            adjusted_model = f"models/{league}_adjusted{prior}.pkl"
+            stages += [
+                Stage(
+                    f"defense_model_{league}{prior}",
+                    partial(_fit_defense_model, league, prior),
+                    [performances, model, *team_priors],
+                    [defense_model],
+                ),
+                Stage(
+                    f"adjusted_model_{league}{prior}",
+                    partial(_fit_adjusted_model, league, prior),
+                    [performances, model, defense_model, *team_priors],
+                    [adjusted_model],
+                ),
+                Stage(
+                    f"ratings_{league}{prior}",
+                    partial(_rate_league, league, prior),
+                    [performances, model, defense_model, adjusted_model],
+                    [
+                        f"data/{league}_player_ratings{prior}.csv",
+                        f"data/{league}_player_ratings_defense{prior}.csv",
+                        f"data/{league}_player_ratings{prior}.snapshot",
+                    ],
+                ),
+            ]
+    if scrape_names:
+        stages.append(
+            Stage(
+                "names",
+                _scrape_names,
+                [f"data/{league}_player_ratings.csv" for league in _LEAGUES],
+                [f"data/{league}_player_info.csv" for league in _LEAGUES],
+            )
+        )
+    return stages
+
+
+# Stages run in worker processes, so they need to be module-level functions.
+# The scripts are imported inside them so they only load what they need.
+
+
+def _download():
+    import create_all_performances  # pylint: disable=import-outside-toplevel
+
+    asyncio.run(create_all_performances.main())
+
+
+def _fit_vpp_model(league: str):
+    import vpp_model  # pylint: disable=import-outside-toplevel
+
+    vpp_model.main(league)
+
+
+def _fit_allocator(league: str):
+    import fit_possession_allocator  # pylint: disable=import-outside-toplevel
+
+    fit_possession_allocator.main(league)
+
+
+def _fit_defense_model(league: str, prior: str):
+    performances = build_combined_df(league, verbose=False)
+    model = LeagueModel.load(f"models/{league}.pkl")
+    prior_getter = build_prior_getter(league) if prior else None
+    fit_defense_model(performances, model, prior_getter).save(
+        f"models/{league}_defense{prior}.pkl"
+    )
+
+
+def _fit_adjusted_model(league: str, prior: str):
+    performances = build_combined_df(league, verbose=False)
+    model = LeagueModel.load(f"models/{league}.pkl")
+    defense_model = LeagueModel.load(f"models/{league}_defense{prior}.pkl")
+    prior_getter = build_prior_getter(league) if prior else None
+    fit_adjusted_model(
+        performances,
+        model,
+        defense_model,
+        prior_getter,
+        polynomial_power=3 if prior else 5,
+    ).save(f"models/{league}_adjusted{prior}.pkl")
+
+
+def _rate_league(league: str, prior: str):
+    import current_teams  # pylint: disable=import-outside-toplevel
+
+    current_teams.rate_league(league, prior)
+
+
+def _build_team_priors(league: str):
+    team_priors = build_team_priors(
+        pd.read_csv(f"data/{league}_player_ratings.csv", index_col=0),
+        pd.read_csv(f"data/{league}_player_info.csv", index_col="player_id"),
+        build_combined_df(league, verbose=False),
+    )
+    team_priors.to_csv(f"data/{league}_team_priors.csv")
+
+
+def _scrape_names():
+    import names  # pylint: disable=import-outside-toplevel
+
+    names.main()
+
+
+if __name__ == "__main__":
+    Fire(main)
@@ -0,0 +1,54 @@
+import threading
+import time
+from pathlib import Path
+from fire import Fire
+
+from individual_players.ratings_service import RatingsService, RatingsSnapshot, serve
+
+
+_LEAGUES = ["mens", "womens"]
+
+
+def main(
+    prior: str = "", host: str = "127.0.0.1", port: int = 8000, poll_seconds: int = 30
+):
+    """Serve current_teams.py's ratings over HTTP on localhost,
+    reloading a league whenever its ratings files change"""
+    service = RatingsService.load(_LEAGUES, prior)
+    watcher = threading.Thread(
+        target=_reload_changed, args=(service, prior, poll_seconds), daemon=True
+    )
+    watcher.start()
+    serve(service, host, port)
+
+
+def _reload_changed(service: RatingsService, prior: str, poll_seconds: int):
+    last_modified = {league: _get_modified(league, prior) for league in _LEAGUES}
+    while True:
+        time.sleep(poll_seconds)
+        for league in _LEAGUES:
+            modified = _get_modified(league, prior)
+            if modified == last_modified[league]:
+                continue
+            try:
+                service.reload(league, RatingsSnapshot.load(league, prior))
+            except (OSError, ValueError) as error:
+                # Probably caught it mid-write, so try again next time
+                print(f"Couldn't reload {league}: {error}")
+                continue
+            last_modified[league] = modified
+            print(f"Reloaded {league}")
+
+
+def _get_modified(league: str, prior: str) -> tuple[float, ...]:
+    paths = [
+        Path("data", f"{league}_player_ratings{prior}.snapshot"),
+        Path("data", f"{league}_player_ratings{prior}.csv"),
+        Path("data", f"{league}_player_ratings_defense{prior}.csv"),
+        Path("data", f"{league}_player_info.csv"),
+    ]
+    return tuple(p.stat().st_mtime if p.exists() else 0.0 for p in paths)
+
+
+if __name__ == "__main__":
+    Fire(main)
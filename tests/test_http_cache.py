@@ -0,0 +1,60 @@
+import asyncio
+from pathlib import Path
+import aiohttp
+import pytest
+from aiohttp import web
+
+from individual_players.http_cache import CachedClient
+
+
+async def _get_with_server(cache_dir: Path, paths: list[str], **client_kwargs):
+    """GET each path from a local server that fails /flaky's first request
+    and 404s /missing, returning the bodies and how often each path was hit"""
+    hits: dict[str, int] = {}
+
+    async def handle(request: web.Request) -> web.Response:
+        hits[request.path] = hits.get(request.path, 0) + 1
+        if request.path == "/missing":
+            return web.Response(status=404)
+        if request.path == "/flaky" and hits[request.path] == 1:
+            return web.Response(status=503)
+        return web.Response(body=f"page {request.path}".encode())
+
+    app = web.Application()
+    app.router.add_get("/{name}", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    try:
+        async with CachedClient(
+            cache_dir, backoff_seconds=0, **client_kwargs
+        ) as client:
+            bodies = [await client.get(f"http://127.0.0.1:{port}{p}") for p in paths]
+    finally:
+        await runner.cleanup()
+    return bodies, hits
+
+
+def test_caches_responses(tmp_path: Path):
+    bodies, hits = asyncio.run(_get_with_server(tmp_path, ["/a", "/a", "/b"]))
+    assert bodies == [b"page /a", b"page /a", b"page /b"]
+    assert hits == {"/a": 1, "/b": 1}
+
+
+def test_expired_responses_are_fetched_again(tmp_path: Path):
+    _, hits = asyncio.run(_get_with_server(tmp_path, ["/a", "/a"], ttl_seconds=0))
+    assert hits == {"/a": 2}
+
+
+def test_retries_server_errors(tmp_path: Path):
+    bodies, hits = asyncio.run(_get_with_server(tmp_path, ["/flaky"]))
+    assert bodies == [b"page /flaky"]
+    assert hits == {"/flaky": 2}
+
+
+def test_raises_for_other_statuses(tmp_path: Path):
+    with pytest.raises(aiohttp.ClientResponseError):
+        asyncio.run(_get_with_server(tmp_path, ["/missing"]))
+    assert not list(tmp_path.rglob("*"))
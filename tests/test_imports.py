@@ -0,0 +1,62 @@
+import importlib.util
+import subprocess
+import sys
+from pathlib import Path
+import pytest
+
+
+_REPO_ROOT = Path(__file__).parent.parent
+
+
+def _import_in_subprocess(statement: str) -> tuple[float, set[str]]:
+    """Seconds the import took and the modules it loaded, in a fresh interpreter
+    so the modules other tests loaded don't count"""
+    output = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, time\n"
+            "start = time.perf_counter()\n"
+            f"{statement}\n"
+            "print(time.perf_counter() - start)\n"
+            "print(' '.join(sys.modules))",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=_REPO_ROOT,
+    ).stdout.splitlines()
+    return float(output[-2]), set(output[-1].split())
+
+
+def _needs(*modules: str):
+    missing = [m for m in modules if importlib.util.find_spec(m) is None]
+    return pytest.mark.skipif(bool(missing), reason=f"{missing} aren't installed")
+
+
+# (what an entry point imports, seconds it's allowed, modules it shouldn't load)
+# The budgets are loose, so they only catch something heavy being imported
+@pytest.mark.parametrize(
+    "statement, budget_seconds, not_loaded",
+    [
+        pytest.param(
+            "import individual_players", 0.5, {"pandas", "dill"}, id="package"
+        ),
+        # cli.py fit_params only needs sklearn
+        pytest.param("import cli", 5, {"statsmodels", "dill", "tqdm"}, id="cli"),
+        # create_all_performances.py only needs players
+        pytest.param(
+            "import individual_players.players",
+            3,
+            {"pandas", "sklearn", "statsmodels"},
+            id="players",
+            marks=_needs("endgame", "endgame_aws"),
+        ),
+    ],
+)
+def test_entry_point_imports(
+    statement: str, budget_seconds: float, not_loaded: set[str]
+):
+    seconds, loaded = _import_in_subprocess(statement)
+    assert not loaded & not_loaded
+    assert seconds < budget_seconds
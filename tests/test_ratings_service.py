@@ -0,0 +1,115 @@
+import json
+import threading
+from pathlib import Path
+from typing import Iterator
+from urllib.error import HTTPError
+from urllib.request import urlopen
+import pandas as pd
+import pytest
+
+from individual_players.ratings_service import (
+    RatingsService,
+    RatingsSnapshot,
+    make_server,
+)
+
+
+def _write_ratings(data_dir: Path, offense: dict, defense: dict, teams: dict):
+    """current_teams.py's and names.py's CSVs, from player_id -> values"""
+
+    def to_csv(ratings: dict, name: str):
+        pd.DataFrame.from_dict(
+            ratings, orient="index", columns=["vpp", "vpp_var"]
+        ).to_csv(data_dir / name)
+
+    to_csv(offense, "mens_player_ratings.csv")
+    to_csv(defense, "mens_player_ratings_defense.csv")
+    pd.DataFrame({"player_id": list(teams), "team_id": list(teams.values())}).to_csv(
+        data_dir / "mens_player_info.csv"
+    )
+
+
+@pytest.fixture
+def data_dir(tmp_path: Path) -> Path:
+    _write_ratings(
+        tmp_path,
+        offense={1: (0.3, 0.01), 2: (0.5, 0.02), 3: (0.1, 0.03)},
+        # Player 3 doesn't have a defense rating
+        defense={1: (-0.1, 0.01), 2: (0.2, 0.02)},
+        teams={1: "a", 2: "a", 3: "b"},
+    )
+    return tmp_path
+
+
+@pytest.fixture
+def service(data_dir: Path) -> RatingsService:
+    return RatingsService.load(["mens"], data_dir=data_dir)
+
+
+@pytest.fixture
+def get(service: RatingsService) -> Iterator:
+    """GET a path from the service on localhost, returning (status, JSON body)"""
+    server = make_server(service, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    def _get(path: str):
+        url = f"http://127.0.0.1:{server.server_port}{path}"
+        try:
+            with urlopen(url) as response:
+                return response.status, json.loads(response.read())
+        except HTTPError as error:
+            return error.code, json.loads(error.read())
+
+    yield _get
+    server.shutdown()
+    server.server_close()
+
+
+def test_player(get):
+    status, player = get("/mens/players/2")
+    assert status == 200
+    assert player == {
+        "player_id": 2,
+        "team_id": "a",
+        "vpp": 0.5,
+        "vpp_var": 0.02,
+        "defense_vpp": 0.2,
+        "defense_var": 0.02,
+    }
+    assert get("/mens/players/4")[0] == 404
+
+
+def test_missing_ratings_are_null(get):
+    _, player = get("/mens/players/3")
+    assert player["defense_vpp"] is None
+    assert player["defense_var"] is None
+
+
+def test_team(get):
+    status, players = get("/mens/teams/a")
+    assert status == 200
+    assert [p["player_id"] for p in players] == [2, 1]
+    assert get("/mens/teams/c") == (200, [])
+
+
+def test_top(get):
+    _, by_offense = get("/mens/top?n=2")
+    assert [p["player_id"] for p in by_offense] == [2, 1]
+    # Lower defense is better, and players without one go last
+    _, by_defense = get("/mens/top?by=defense_vpp")
+    assert [p["player_id"] for p in by_defense] == [1, 2, 3]
+    assert get("/mens/top?by=name")[0] == 400
+
+
+def test_reload(get, service: RatingsService, data_dir: Path):
+    _write_ratings(
+        data_dir,
+        offense={1: (0.9, 0.01), 4: (0.4, 0.01)},
+        defense={1: (0.0, 0.01), 4: (0.0, 0.01)},
+        teams={1: "a", 4: "b"},
+    )
+    service.reload("mens", RatingsSnapshot.load("mens", data_dir=data_dir))
+    assert get("/mens/players/1")[1]["vpp"] == 0.9
+    assert get("/mens/players/2")[0] == 404
+    assert [p["player_id"] for p in get("/mens/top")[1]] == [1, 4]
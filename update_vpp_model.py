@@ -0,0 +1,22 @@
+from fire import Fire
+
+from individual_players import build_combined_df
+from individual_players.league_state import LeagueModelState
+
+
+def main(gender: str, *seasons: int):
+    """Refit models/{gender}.pkl after adding new seasons' performances
+
+    Only reads the new seasons' files, and merges them into the stats
+    saved by vpp_model.py, so it doesn't matter how much history there is.
+    Don't pass seasons that are already in the state, they'd be double counted.
+    """
+    state_path = f"models/{gender}_league_state.npz"
+    new_performances = build_combined_df(gender, seasons=list(seasons))
+    state = LeagueModelState.load(state_path).add_performances(new_performances)
+    state.fit().save(f"models/{gender}.pkl")
+    state.save(state_path)
+
+
+if __name__ == "__main__":
+    Fire(main)
@@ -5,24 +5,48 @@ from individual_players.league_model import (
     add_player_aggregates,
     fit_std_by_sample_size,
 )
+from individual_players.league_state import LeagueModelState
+from individual_players.stage_report import StageReport
 
 
-def main(gender: str):
+def main(gender: str, report_dir: str | None = None):
     """Script version of vpp_model.ipynb
 
     Creates a saved model file that'll have all the info it needs to create
     priors of player performances (measured by VPP) and update them.
+
+    Also saves the stats needed to refit it when new seasons come in
+    without reloading all of history (see update_vpp_model.py).
+
+    Parameters
+    ----------
+    gender
+        The league (mens or womens)
+    report_dir, optional
+        Save a timing/memory report of each stage here (see StageReport)
     """
-    performances = build_combined_df(gender)
-    with_player_aggregates, by_player = add_player_aggregates(performances)
-    _, get_vpp_sd = fit_std_by_sample_size(with_player_aggregates)
-    career_vpp = by_player.total_value / by_player.total_possessions
-    model = LeagueModel(
-        possessions_to_vpp_std=get_vpp_sd,
-        vpp_mean=career_vpp.mean(),
-        vpp_variance=career_vpp.var(),  # type: ignore[arg-type]
-    )
-    model.save(f"models/{gender}_league.pkl")
+    with StageReport(f"vpp_model_{gender}", report_dir) as report:
+        with report.stage("load") as stage:
+            performances = build_combined_df(gender)
+            stage.n_rows = len(performances)
+        with report.stage("aggregate") as stage:
+            with_player_aggregates, by_player = add_player_aggregates(
+                performances, fit_columns_only=True
+            )
+            stage.n_rows = len(by_player)
+        with report.stage("fit"):
+            _, get_vpp_sd = fit_std_by_sample_size(with_player_aggregates)
+            career_vpp = by_player.total_value / by_player.total_possessions
+            model = LeagueModel(
+                possessions_to_vpp_std=get_vpp_sd,
+                vpp_mean=career_vpp.mean(),
+                vpp_variance=career_vpp.var(),  # type: ignore[arg-type]
+            )
+        with report.stage("save"):
+            model.save(f"models/{gender}.pkl")
+            LeagueModelState.from_performances(
+                performances, with_player_aggregates=with_player_aggregates
+            ).save(f"models/{gender}_league_state.npz")
 
 
 if __name__ == "__main__":